@@ -0,0 +1,8 @@
+# _*_ coding: utf-8 _*_
+
+''' DataCite XML from node-object json (mkdcxml.mkdcxml) and from CKAN
+(mkdcxml.ckanextract, mkdcxml.pipeline, mkdcxml.harvest).
+
+Nothing is imported here, so that the command line tools start fast.
+
+'''
@@ -0,0 +1,112 @@
+# _*_ coding: utf-8 _*_
+
+''' asyncio client for the CKAN action API.
+
+AsyncCKAN makes CKAN API calls concurrently within one event loop.
+The number of requests in flight is limited per client, each request
+has a timeout, and failed requests are retried with exponential
+backoff and full jitter (a random delay between 0 and the backoff).
+Responses and errors are translated exactly as ckanapi.RemoteCKAN
+does it, so callers see the same exceptions (NotFound, ...).
+
+Several clients (e.g. for data.eawag.ch and opendata.eawag.ch) can
+run in the same event loop, see fetch_packages(). The command line
+tools use it for one server at a time: "ckanharvest --async" for the
+harvested packages and "ckan2xml --async" to fetch all named packages
+before they are converted.
+
+Requires aiohttp (https://docs.aiohttp.org).
+
+'''
+
+import random
+import asyncio
+from ckanapi import CKANAPIError
+from ckanapi.common import prepare_action, reverse_apicontroller_action
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from mkdcxml.harvest import permanent_errors
+
+
+class AsyncCKAN:
+
+    def __init__(self, server, apikey=None, concurrency=10, timeout=30,
+                 retries=3, backoff=0.5):
+        if aiohttp is None:
+            raise ImportError('The asyncio CKAN client requires aiohttp')
+        self.server = server.rstrip('/')
+        self.apikey = apikey
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.concurrency = concurrency
+        self.session = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        self.session = aiohttp.ClientSession(connector=connector)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    async def _request(self, action, data):
+        path, body, headers = prepare_action(action, data, self.apikey)
+        url = '{}/{}'.format(self.server, path)
+        async with self.semaphore:
+            async with self.session.post(url, data=body, headers=headers,
+                                         timeout=self.timeout) as resp:
+                text = await resp.text()
+                return reverse_apicontroller_action(url, resp.status, text)
+
+    async def call_action(self, action, data=None):
+        'call_action with timeout, retries, and backoff with jitter.'
+        for attempt in range(self.retries + 1):
+            try:
+                return await self._request(action, data)
+            except permanent_errors():
+                raise
+            except (CKANAPIError, aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt == self.retries:
+                    raise
+                delay = self.backoff * 2 ** attempt
+                await asyncio.sleep(random.uniform(0, delay))
+
+    async def package_show(self, name):
+        return await self.call_action('package_show', {'id': name})
+
+    async def show(self, name):
+        'Returns (name, package_show result) or (name, exception).'
+        try:
+            return name, await self.package_show(name)
+        except Exception as e:
+            return name, e
+
+    async def fetch(self, names):
+        'Fetches all packages <names> concurrently; list of (name, meta).'
+        return await asyncio.gather(*(self.show(n) for n in names))
+
+
+async def _fetch_all(jobs, **kwargs):
+    async def one_server(server, apikey, names):
+        async with AsyncCKAN(server, apikey=apikey, **kwargs) as client:
+            return server, await client.fetch(names)
+    results = await asyncio.gather(*(one_server(s, a, n)
+                                     for s, (a, n) in jobs.items()))
+    return dict(results)
+
+
+def fetch_packages(jobs, **kwargs):
+    '''Fetches packages from several CKAN instances in one event loop.
+    <jobs> maps server urls to (apikey, [package names]). <kwargs> are
+    passed to AsyncCKAN (concurrency, timeout, retries, backoff).
+    Returns a dict that maps the server urls to lists of (name, meta),
+    where meta is an exception if the package could not be fetched.
+
+    '''
+    return asyncio.run(_fetch_all(jobs, **kwargs))
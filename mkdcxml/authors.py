@@ -0,0 +1,241 @@
+# _*_ coding: utf-8 _*_
+
+'''authors
+
+Usage:
+  authors import <authorsdb> [--orcids=<orcids>] [--affils=<affilmap>]
+  authors add <authorsdb> <name> [--orcid=<orcid>]
+              [--affiliation=<affiliation>] [--email=<email>]
+  authors lookup <authorsdb> <name> [--email=<email>]
+  authors -h
+
+Options:
+  --orcids=<orcids>            JSON file that maps authors to ORCIDs
+                               (see ckanextract).
+  --affils=<affilmap>          JSON file that maps authors to affiliations
+                               (see ckanextract).
+  --orcid=<orcid>              ORCID of the author.
+  --affiliation=<affiliation>  Affiliation of the author.
+  --email=<email>              Email of the author.
+  --help, -h                   Show this screen
+
+Arguments:
+  <authorsdb>    The author store (a SQLite file).
+  <name>         "Lastname, Firstname"
+
+This module parses CKAN author strings (parse_author) and maintains a
+persistent store of authors with their ORCID
+and affiliation, which the extractors query instead of asking
+interactively.
+
+Authors are found by their name, normalized (case, accents, whitespace,
+punctuation), by their email, or - if only initials are given - by
+family name and initials ("Doe, J." finds "Doe, Jane" if there is no
+other "Doe, J...", "Doe, John" does not). Authors that are not found
+are collected in a report.
+
+'''
+
+import re
+import sys
+import json
+import sqlite3
+import unicodedata
+from functools import lru_cache
+from collections import namedtuple
+from docopt import docopt
+
+# "<jane@example.org>", "(jane@example.org)" or a bare address
+EMAIL = re.compile(r'<\s*([^<>\s]+@[^<>\s]+)\s*>'
+                   r'|\(\s*([^()\s]+@[^()\s]+)\s*\)'
+                   r'|([^\s<>(),;]+@[^\s<>(),;]+)')
+COMMA = re.compile(r'\s*,\s*')
+SPACE = re.compile(r'\s+')
+FOLD_PUNCTUATION = re.compile(r'[.\-_\']+')
+
+Author = namedtuple('Author', ['last', 'first', 'email'])
+
+
+@lru_cache(maxsize=4096)
+def parse_author(s):
+    '''Parses a CKAN author string into Author(last, first, email).
+
+    Understands "Last, First", "Last, First <email>", "Last, First, Jr."
+    (further parts are appended to the given name), "First Last" and
+    emails in angle brackets, parentheses or bare. Missing parts are ''
+    (email: None). Results are cached, as the same people appear in
+    many packages.
+
+    '''
+    email = None
+    m = EMAIL.search(s)
+    if m:
+        email = next(g for g in m.groups() if g)
+        s = s[:m.start()] + s[m.end():]
+    s = SPACE.sub(' ', s).strip(' ,;')
+    if ',' in s:
+        last, *given = [p for p in COMMA.split(s) if p]
+        first = ' '.join(given)
+    else:
+        # "First Last"
+        *given, last = s.split(' ') if s else ['']
+        first = ' '.join(given)
+    return Author(last, first, email)
+
+
+def fold(s):
+    'Lower case, without accents, punctuation and redundant whitespace.'
+    s = unicodedata.normalize('NFKD', s)
+    s = ''.join(c for c in s if not unicodedata.combining(c)).casefold()
+    s = FOLD_PUNCTUATION.sub(' ', s)
+    return ' '.join(s.split())
+
+
+def name_keys(last, first):
+    'Returns the (full name, initials) lookup keys of an author.'
+    last, first = fold(last), fold(first)
+    initials = ''.join(p[0] for p in first.split())
+    return '{}, {}'.format(last, first), '{}, {}'.format(last, initials)
+
+
+def is_initials(first):
+    'True if the given name <first> consists of initials only ("J.", "J. P.").'
+    return all(len(p) == 1 for p in fold(first).split())
+
+
+def split_name(name):
+    '"Lastname, Firstname" -> (Lastname, Firstname)'
+    last, _, first = name.partition(',')
+    return last.strip(), first.strip()
+
+
+class AuthorStore:
+
+    def __init__(self, path=':memory:'):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS authors (
+              id INTEGER PRIMARY KEY, name TEXT, email TEXT,
+              orcid TEXT, affiliation TEXT,
+              fullkey TEXT UNIQUE, initialskey TEXT);
+            CREATE INDEX IF NOT EXISTS authors_email ON authors (email);
+            CREATE INDEX IF NOT EXISTS authors_initials
+              ON authors (initialskey);
+        ''')
+        self.db.commit()
+        # authors that could not be resolved, see report()
+        self.unresolved = []
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, last, first, email=None, orcid=None, affiliation=None,
+            commit=True):
+        '''Adds an author, or updates the given fields of an author with
+        the same (normalized) name.
+
+        '''
+        fullkey, initialskey = name_keys(last, first)
+        email = email.strip().casefold() if email else None
+        self.db.execute(
+            'INSERT INTO authors'
+            ' (name, email, orcid, affiliation, fullkey, initialskey)'
+            ' VALUES (?, ?, ?, ?, ?, ?)'
+            ' ON CONFLICT (fullkey) DO UPDATE SET'
+            ' email = COALESCE(excluded.email, email),'
+            ' orcid = COALESCE(excluded.orcid, orcid),'
+            ' affiliation = COALESCE(excluded.affiliation, affiliation)',
+            ('{}, {}'.format(last, first), email, orcid, affiliation,
+             fullkey, initialskey))
+        if commit:
+            self.db.commit()
+
+    def import_maps(self, orcids=None, affils=None):
+        '''Bulk import of the json maps {"Lastname, Firstname": value}
+        for ORCIDs and affiliations.
+
+        '''
+        for name, orcid in (orcids or {}).items():
+            self.add(*split_name(name), orcid=orcid, commit=False)
+        for name, affiliation in (affils or {}).items():
+            self.add(*split_name(name), affiliation=affiliation,
+                     commit=False)
+        self.db.commit()
+
+    def _one(self, column, key):
+        rows = self.db.execute(
+            'SELECT name, orcid, affiliation FROM authors'
+            ' WHERE {} = ?'.format(column), (key,)).fetchall()
+        return rows[0] if len(rows) == 1 else None
+
+    def lookup(self, last, first, email=None):
+        '''Returns the dict {"name", "orcid", "affiliation"} of the author,
+        or None if the author is not known (or ambiguous).
+
+        '''
+        fullkey, initialskey = name_keys(last, first)
+        row = self._one('fullkey', fullkey)
+        if row is None and email:
+            row = self._one('email', email.strip().casefold())
+        if row is None and is_initials(first):
+            # only initials were given: "Doe, J." finds "Doe, Jane",
+            # but "Doe, John" must not
+            row = self._one('initialskey', initialskey)
+        if row is None:
+            return None
+        return dict(zip(('name', 'orcid', 'affiliation'), row))
+
+    def resolve(self, last, first, email=None, context=None):
+        '''Like lookup(), but records authors that are not found (with
+        <context>, e.g. the package name) for the report.
+
+        '''
+        author = self.lookup(last, first, email)
+        if author is None:
+            self.unresolved.append({'name': '{}, {}'.format(last, first),
+                                    'email': email, 'context': context})
+        return author
+
+    def report(self, f=None):
+        'Writes the unresolved authors as json to the open file <f>.'
+        json.dump(self.unresolved, f or sys.stderr, indent=2,
+                  ensure_ascii=False)
+
+
+def report_unresolved(store, filename='-'):
+    'Writes the report of <store> to <filename> ("-" or None: stderr).'
+    if filename and filename != '-':
+        with open(filename, 'w') as f:
+            store.report(f)
+    else:
+        store.report()
+
+
+def main():
+    args = docopt(__doc__, argv=sys.argv[1:])
+    with AuthorStore(args['<authorsdb>']) as store:
+        if args['import']:
+            load = lambda fn: json.load(open(fn, 'r')) if fn else None
+            store.import_maps(orcids=load(args['--orcids']),
+                              affils=load(args['--affils']))
+        elif args['add']:
+            store.add(*split_name(args['<name>']), email=args['--email'],
+                      orcid=args['--orcid'],
+                      affiliation=args['--affiliation'])
+        elif args['lookup']:
+            author = store.lookup(*split_name(args['<name>']),
+                                  email=args['--email'])
+            print(json.dumps(author, ensure_ascii=False))
+            if author is None:
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+# _*_ coding: utf-8 _*_
+
+''' Batch conversion of many metadata json-files to DataCite XML.
+
+The input files are distributed over a pool of worker processes, so
+that the interpreter start-up and imports are paid once per worker
+and not once per document. Each input file <name>.json results in one
+output file <name>.xml, either next to the input or in a given output
+directory.
+
+Each worker compiles the schema once at start-up (see
+mkdcxml.prewarm); all documents converted by that worker share it.
+
+A summary (number of passed / failed / broken conversions, timings and
+one record per input file) is returned and optionally written as json.
+A file can be written in several versions of the DataCite schema (see
+mkdcxml.typ_of): the tree is built once, in the version the metadata
+declares, and transformed to the others. With more than one version
+the output files are named <name>.<typ>.xml.
+With timings, the record of each file has the time of each stage (see
+mkdcxml.timing) and the summary their percentiles.
+
+'''
+
+import os
+import sys
+import json
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+from mkdcxml.mkdcxml import MetaDataWriter, prewarm, typ_of
+from mkdcxml.timing import (Timings, Profiler, percentiles,
+                            report_percentiles)
+
+# the number of validation errors report() shows per file
+REPORTED_ERRORS = 5
+
+
+def collect_inputs(paths, suffixes=('.json',)):
+    '''Expands directories in <paths> to the files they contain that end
+    with one of <suffixes> (default: the json-files).
+
+    '''
+    inputs = []
+    for p in paths:
+        if os.path.isdir(p):
+            inputs += sorted(os.path.join(p, f) for f in os.listdir(p)
+                             if f.endswith(tuple(suffixes)))
+        else:
+            inputs.append(p)
+    return inputs
+
+
+def outname(infile, outdir=None, typ=None):
+    '''Returns the name of the XML file that corresponds to <infile>
+    (<name>.<typ>.xml if <typ> is given).
+
+    '''
+    base = os.path.splitext(os.path.basename(infile))[0]
+    base += '.{}.xml'.format(typ) if typ else '.xml'
+    return os.path.join(outdir or os.path.dirname(infile), base)
+
+
+def init_worker(trace=False):
+    'Initializer of the worker processes.'
+    prewarm()
+    if trace:
+        tracemalloc.start()
+
+
+def convert_one(job):
+    '''Converts one file. <job> is a tuple (infile, outputs, validate,
+    timed, profile), where <outputs> is a list of (typ, outfile),
+    <timed> requests per-stage timings and <profile> is None or
+    (threshold, kind) (see timing.Profiler). Returns a record describing
+    the outcome. Exceptions are caught, so that a single broken input
+    does not bring down the batch.
+
+    '''
+    infile, outputs, validate, timed, profile = job
+    record = {'input': infile, 'output': outputs[0][1]}
+    timings = Timings() if timed else None
+    prof = Profiler(*profile) if profile is not None else None
+    start = time.perf_counter()
+    try:
+        if prof is not None:
+            with prof.profile(outputs[0][1]):
+                writers = convert_file(infile, outputs, validate, timings)
+        else:
+            writers = convert_file(infile, outputs, validate, timings)
+        versions = [version_record(mdw, outfile)
+                    for mdw, (typ, outfile) in zip(writers, outputs)]
+        if len(versions) == 1:
+            record.update(versions[0])
+        else:
+            record['versions'] = versions
+            statuses = [v['status'] for v in versions]
+            record['status'] = ('failed' if 'failed' in statuses else
+                                statuses[0])
+    except Exception as e:
+        record['status'] = 'error'
+        record['error'] = '{}: {}'.format(type(e).__name__, e)
+    record['seconds'] = time.perf_counter() - start
+    if timings is not None:
+        record['timings'] = timings.as_dict()
+    if prof is not None and prof.dumps:
+        record['profile'] = prof.dumps[0]
+    return record
+
+
+def version_record(mdw, outfile):
+    'The outcome of writing <mdw> to <outfile>.'
+    record = {'typ': mdw.typ, 'output': outfile}
+    if mdw.validation is None:
+        record['status'] = 'unchecked'
+    else:
+        record['status'] = 'passed' if mdw.valid else 'failed'
+        record['errors'] = mdw.validation.as_dict()['errors']
+    return record
+
+
+def convert_file(infile, outputs, validate, timings=None):
+    '''Writes <infile> to each (typ, outfile) of <outputs> (typ "auto":
+    the version the metadata declares). Returns the MetaDataWriters.
+
+    '''
+    source = MetaDataWriter(infile, typ='auto', validate='skip',
+                            timings=timings)
+    writers = []
+    for typ, outfile in outputs:
+        mdw = source.to_version(typ, validate='eager' if validate
+                                else 'skip')
+        mdw.writexml(outfile)
+        writers.append(mdw)
+    return writers
+
+
+def run_batch(inputs, outdir=None, workers=None, summaryfile=None,
+              validate=True, timings=False, trace=False, profile=None,
+              typs=('auto',)):
+    '''Converts all <inputs> to the schema versions <typs> using
+    <workers> processes (default: number of CPUs). Returns the summary
+    (a dict).
+
+    timings:  time the stages of each conversion.
+    trace:    trace allocations with tracemalloc.
+    profile:  dump the profile of conversions that take longer than
+              <profile> seconds (see timing.Profiler).
+
+    '''
+    inputs = collect_inputs(inputs)
+    if outdir:
+        os.makedirs(outdir, exist_ok=True)
+    if profile is not None:
+        profile = (profile, 'tracemalloc' if trace else 'cprofile')
+    typs = list(typs)
+    jobs = [(f, [(typ, outname(f, outdir, typ if len(typs) > 1 else None))
+                 for typ in typs], validate, timings, profile)
+            for f in inputs]
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(jobs) // (4 * workers))
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(trace,)) as pool:
+        records = list(pool.map(convert_one, jobs, chunksize=chunksize))
+    return summarize(records, time.perf_counter() - start, summaryfile)
+
+
+def summarize(records, wall, summaryfile=None):
+    '''Aggregates the per-file <records> into a summary (and writes it as
+    json to <summaryfile>).
+
+    '''
+    summary = {
+        'total': len(records),
+        'passed': sum(r['status'] == 'passed' for r in records),
+        'failed': sum(r['status'] == 'failed' for r in records),
+        'errors': sum(r['status'] == 'error' for r in records),
+        'unchecked': sum(r['status'] == 'unchecked' for r in records),
+        'wall_seconds': wall,
+        'cpu_seconds': sum(r['seconds'] for r in records),
+        'files': records,
+    }
+    timings = [r['timings'] for r in records if 'timings' in r]
+    if timings:
+        summary['stages'] = percentiles(timings)
+    if summaryfile:
+        with open(summaryfile, 'w') as f:
+            json.dump(summary, f, indent=2)
+    return summary
+
+
+def main(args):
+    'Entry point for "mkdcxml batch". <args> are the parsed docopt arguments.'
+    workers = int(args['--jobs']) if args['--jobs'] else None
+    profile = float(args['--profile']) if args['--profile'] else None
+    summary = run_batch(args['<input>'], outdir=args['--outdir'],
+                        workers=workers, summaryfile=args['--summary'],
+                        validate=not args['--no-validate'],
+                        timings=args['--timings'],
+                        trace=args['--tracemalloc'], profile=profile,
+                        typs=typ_list(args['--schema']))
+    return report(summary)
+
+
+def typ_list(versions):
+    '''Parses the comma separated <versions> (e.g. "4.1,4.4") into a
+    list of typs ("auto" if not given).
+
+    '''
+    if not versions:
+        return ['auto']
+    return [v.strip() if v.strip() == 'auto' else typ_of(v.strip())
+            for v in versions.split(',')]
+
+
+def report(summary, max_errors=REPORTED_ERRORS):
+    '''Prints failures (with the exception, or the first <max_errors>
+    validation errors) and counts to stderr and returns the exit status.
+
+    '''
+    for r in summary['files']:
+        if r['status'] in ('failed', 'error'):
+            print('{}: {}'.format(r['status'].upper(), r['input']),
+                  file=sys.stderr)
+            if 'error' in r:
+                print('  {}'.format(r['error']), file=sys.stderr)
+            errors = r.get('errors') or []
+            for e in errors[:max_errors]:
+                print('  {path}:{line}: {message}'.format(**e),
+                      file=sys.stderr)
+            if len(errors) > max_errors:
+                print('  ... {} more'.format(len(errors) - max_errors),
+                      file=sys.stderr)
+        if 'profile' in r:
+            print('PROFILED ({:.3f} s): {}: {}'.format(
+                r['seconds'], r['input'], r['profile']), file=sys.stderr)
+    if 'stages' in summary:
+        report_percentiles(summary['stages'])
+    print('{total} files: {passed} passed, {failed} failed, {errors} errors,'
+          ' {unchecked} not validated'
+          ' ({wall_seconds:.2f} s)'.format(**summary), file=sys.stderr)
+    return 0 if not (summary['failed'] or summary['errors']) else 1
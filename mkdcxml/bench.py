@@ -0,0 +1,330 @@
+# _*_ coding: utf-8 _*_
+
+'''mkdcbench
+
+Usage:
+  mkdcbench [-n <sizes>] [-r <repeat>] [-o <results>] [--no-extract]
+            [--baseline=<results>]
+  mkdcbench startup [-r <repeat>] [-o <results>]
+                    [--import-budget=<seconds>] [--help-budget=<seconds>]
+  mkdcbench -h
+
+Options:
+  --sizes, -n <sizes>      Comma separated workload sizes (number of
+                           creators, subjects, related identifiers, points,
+                           description lines). [default: 1,10,100,1000]
+  --repeat, -r <repeat>    Repetitions of each measurement. [default: 5]
+  --output, -o <results>   Write the results (json) to <results>.
+                           [default: -]
+  --no-extract             Don't benchmark CKANExtract.
+  --baseline=<results>     Compare with earlier results and print the
+                           ratio (now / baseline) of each timing.
+  --import-budget=<seconds>  Maximum time to import a command line
+                           module. [default: 0.1]
+  --help-budget=<seconds>  Maximum time for "<command> --help", including
+                           the start of the interpreter. [default: 0.4]
+  --help, -h               Show this screen
+
+This module benchmarks mkdcxml with synthetic workloads of increasing
+size. For every size it generates a node-object record (see
+synthetic_record) and times the stages of MetaDataWriter separately:
+
+  readmeta    _readmeta (json decoding)
+  build_tree  _build_tree
+  validate    _validate
+  writexml    writexml (serialization, to a file)
+
+and CKANExtract applied to a canned package_show result of the same
+size (extract; see synthetic_package). The minimum and median of
+<repeat> runs are reported, in seconds.
+
+"mkdcbench startup" guards the start-up time of the command line tools.
+It measures, each in a fresh interpreter, the import of their modules
+and "<command> --help". It exits with status 1 if the minimum of
+<repeat> runs exceeds the budget.
+
+'''
+
+import os
+import sys
+import json
+import time
+import platform
+import statistics
+import subprocess
+import tempfile
+from unittest import mock
+from docopt import docopt
+from lxml import etree as ET
+
+from mkdcxml import codec
+from mkdcxml.mkdcxml import MetaDataWriter
+from mkdcxml.node import Node
+from mkdcxml.output import open_output
+
+STAGES = ('readmeta', 'build_tree', 'validate', 'writexml', 'extract')
+
+# The modules of the command line tools
+COMMANDS = ['mkdcxml.mkdcxml', 'mkdcxml.ckanextract',
+            'mkdcxml.ckanextract_project', 'mkdcxml.pipeline',
+            'mkdcxml.harvest']
+
+IMPORT_TIMER = ('import time; t = time.perf_counter(); import {};'
+                ' print(time.perf_counter() - t)')
+
+
+def synthetic_record(n):
+    '''A valid DataCite node-object with <n> creators, subjects, related
+    identifiers, points of a MultiPoint geoLocation and lines of the
+    description.
+
+    '''
+    creators = [{'creator': [
+        {'creatorName': {'val': 'Lastname{0}, Firstname{0}'.format(i),
+                         'att': {'nameType': 'Personal'}}},
+        {'givenName': 'Firstname{}'.format(i)},
+        {'familyName': 'Lastname{}'.format(i)},
+        {'nameIdentifier': {'val': '0000-0002-{:04d}-{:04d}'.format(i, i),
+                            'att': {'nameIdentifierScheme': 'ORCID',
+                                    'schemeURI': 'https://orcid.org/'}}},
+        {'affiliation': 'Institute {}'.format(i % 7)}]}
+        for i in range(n)]
+    subjects = [{'subject': {'val': 'keyword {}'.format(i),
+                             'att': {'lang': 'en'}}} for i in range(n)]
+    related = [{'relatedIdentifier': {
+        'val': '10.5555/related.{}'.format(i),
+        'att': {'relatedIdentifierType': 'DOI',
+                'relationType': ('Cites', 'IsSupplementTo')[i % 2],
+                'resourceTypeGeneral': 'Dataset'}}} for i in range(n)]
+    points = [{'geoLocation': [{'geoLocationPoint': [
+        {'pointLongitude': str(8 + i / (n + 1))},
+        {'pointLatitude': str(47 - i / (n + 1))}]}]} for i in range(n)]
+    lines = ['Line {} of the abstract, with some more words to make it'
+             ' about as long as a real one.'.format(i) for i in range(n)]
+    description = {'description': {
+        'val': lines[0] if lines else '',
+        'att': {'descriptionType': 'Abstract', 'lang': 'en'},
+        'children': [{'br': {'val': '', 'tail': l}} for l in lines[1:]]}}
+    return {'resource': [
+        {'identifier': {'val': '10.5555/bench.{}'.format(n),
+                        'att': {'identifierType': 'DOI'}}},
+        {'creators': creators},
+        {'titles': [{'title': {'val': 'Benchmark record of size {}'
+                               .format(n), 'att': {'lang': 'en'}}}]},
+        {'publisher': 'Benchmark Publisher'},
+        {'publicationYear': '2020'},
+        {'resourceType': {'val': 'Publication Data Package',
+                          'att': {'resourceTypeGeneral': 'Collection'}}},
+        {'subjects': subjects},
+        {'dates': [{'date': {'val': '2020-01-01',
+                             'att': {'dateType': 'Submitted'}}}]},
+        {'language': 'en'},
+        {'relatedIdentifiers': related},
+        {'version': '1.0'},
+        {'rightsList': [{'rights': {
+            'val': 'CC0 1.0 Universal (CC0 1.0) Public Domain Dedication',
+            'att': {'rightsURI': 'https://creativecommons.org/'
+                    'publicdomain/zero/1.0/', 'lang': 'en'}}}]},
+        {'descriptions': [description]},
+        {'geoLocations': points},
+    ]}
+
+
+def synthetic_package(n):
+    '''A package_show result that CKANExtract turns into a record of
+    about the size of synthetic_record(n).
+
+    '''
+    resources = [{'url': 'https://doi.org/10.5555/related.{}'.format(i),
+                  'description': 'relatedIdentifier\r\n'
+                  'relatedIdentifierType: DOI\r\n'
+                  'relationTypes: Cites, IsSupplementTo',
+                  'resource_type': 'Dataset'} for i in range(n // 2)]
+    resources += [{'url': 'https://example.org/data{}.csv'.format(i),
+                   'description': 'Data file {}'.format(i),
+                   'resource_type': 'Dataset'} for i in range(n - n // 2)]
+    return {
+        'name': 'bench-{}'.format(n),
+        'title': 'Benchmark package of size {}'.format(n),
+        'author': ['Lastname{0}, Firstname{0} <a{0}@example.org>'.format(i)
+                   for i in range(n)],
+        'metadata_created': '2020-03-01T10:00:00.000000',
+        'metadata_modified': '2020-04-01T10:00:00.000000',
+        'generic-terms': ['term {}'.format(i) for i in range(n)],
+        'taxa': ['none'], 'substances': [], 'systems': None,
+        'tags': [{'display_name': 'tag {}'.format(i)} for i in range(n)],
+        'timerange': ['2019-01-01 TO 2019-12-31'] * max(1, n // 10),
+        'resources': resources,
+        'notes': '\r\n'.join('Line {} of the abstract.'.format(i)
+                             for i in range(max(1, n))),
+        'geographic_name': ['Place {}'.format(i) for i in range(n // 10)],
+        'spatial': json.dumps({'type': 'MultiPoint', 'coordinates': [
+            [8 + i / (n + 1), 47 - i / (n + 1)] for i in range(n)]}),
+    }
+
+
+def count_nodes(v):
+    'Number of node-objects (or Nodes) in <v>.'
+    if isinstance(v, Node):
+        return 1 + sum(count_nodes(c) for c in v.children or ())
+    if isinstance(v, list):
+        return sum(count_nodes(x) for x in v)
+    if isinstance(v, dict):
+        if 'val' in v or 'att' in v or 'children' in v or 'tail' in v:
+            return count_nodes(v.get('children', []))
+        return sum(1 + count_nodes(x) for x in v.values())
+    return 0
+
+
+def timeit(fn, repeat):
+    'Runs fn() <repeat> times; returns ({"min", "median"}, last result).'
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+    return {'min': min(times), 'median': statistics.median(times)}, result
+
+
+def bench_writer(n, repeat, tmpdir):
+    'Times the MetaDataWriter stages for synthetic_record(n).'
+    record = synthetic_record(n)
+    jsonfile = os.path.join(tmpdir, 'record-{}.json'.format(n))
+    xmlfile = os.path.join(tmpdir, 'record-{}.xml'.format(n))
+    with open(jsonfile, 'wb') as f:
+        codec.dump(record, f)
+    w = MetaDataWriter(record, validate='skip', build=False)
+    timings = {}
+    timings['readmeta'], w.meta = timeit(lambda: w._readmeta(jsonfile),
+                                         repeat)
+    timings['build_tree'], w.root = timeit(w._build_tree, repeat)
+    timings['validate'], validation = timeit(w._validate, repeat)
+    if not validation.valid:
+        raise RuntimeError('Synthetic record {} is invalid:\n{}'
+                           .format(n, validation))
+    timings['writexml'], _ = timeit(lambda: w.writexml(xmlfile), repeat)
+    return {'size': n, 'nodes': count_nodes(record),
+            'json_bytes': os.path.getsize(jsonfile),
+            'xml_bytes': os.path.getsize(xmlfile),
+            'timings': timings}
+
+
+def bench_extract(n, repeat):
+    'Times CKANExtract for synthetic_package(n).'
+    from mkdcxml.ckanextract import CKANExtract
+    package = synthetic_package(n)
+
+    def extract():
+        return CKANExtract(package['name'], '10.5555/bench', None, None,
+                           None, None, None, ckanmeta=package).extract()
+
+    # Take the defaults of the interactive prompts
+    with mock.patch('builtins.input', return_value=''):
+        timing, meta = timeit(extract, repeat)
+    return timing, count_nodes(meta)
+
+
+def run(sizes, repeat=5, extract=True):
+    'Runs the benchmarks and returns the results.'
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for n in sizes:
+            r = bench_writer(n, repeat, tmpdir)
+            if extract:
+                r['timings']['extract'], r['extract_nodes'] = bench_extract(
+                    n, repeat)
+            results.append(r)
+    return {'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'lxml': '.'.join(str(v) for v in ET.LXML_VERSION),
+            'libxml2': '.'.join(str(v) for v in ET.LIBXML_VERSION),
+            'codec': codec.codec.name,
+            'repeat': repeat,
+            'results': results}
+
+
+def compare(results, baseline):
+    '''Returns the rows (size, stage, seconds, baseline seconds, ratio) of
+    the minimum timings of <results> and <baseline>, for the sizes and
+    stages in both.
+
+    '''
+    base = {r['size']: r['timings'] for r in baseline['results']}
+    rows = []
+    for r in results['results']:
+        for stage in STAGES:
+            try:
+                now = r['timings'][stage]['min']
+                then = base[r['size']][stage]['min']
+            except KeyError:
+                continue
+            rows.append((r['size'], stage, now, then,
+                         now / then if then else float('inf')))
+    return rows
+
+
+def startup(repeat=5, import_budget=0.1, help_budget=0.4):
+    '''Measures the start-up of the COMMANDS. Returns the results, with
+    "ok" False if a budget is exceeded.
+
+    '''
+    # Neither importing nor --help may need the CKAN API keys
+    env = {k: v for k, v in os.environ.items()
+           if not k.startswith('CKAN_APIKEY')}
+    results = []
+    for module in COMMANDS:
+        imports = []
+        helps = []
+        for _ in range(repeat):
+            out = subprocess.run([sys.executable, '-c',
+                                  IMPORT_TIMER.format(module)],
+                                 env=env, check=True, capture_output=True)
+            imports.append(float(out.stdout))
+            t0 = time.perf_counter()
+            subprocess.run([sys.executable, '-m', module, '--help'],
+                           env=env, check=True, capture_output=True)
+            helps.append(time.perf_counter() - t0)
+        results.append({
+            'module': module,
+            'import': {'min': min(imports),
+                       'median': statistics.median(imports),
+                       'budget': import_budget},
+            'help': {'min': min(helps), 'median': statistics.median(helps),
+                     'budget': help_budget}})
+    ok = all(r[k]['min'] <= r[k]['budget']
+             for r in results for k in ('import', 'help'))
+    return {'python': platform.python_version(), 'repeat': repeat,
+            'ok': ok, 'results': results}
+
+
+def main():
+    args = docopt(__doc__, argv=sys.argv[1:])
+    target = None if args['--output'] == '-' else args['--output']
+    if args['startup']:
+        results = startup(repeat=int(args['--repeat']),
+                          import_budget=float(args['--import-budget']),
+                          help_budget=float(args['--help-budget']))
+        with open_output(target) as f:
+            f.write(json.dumps(results, indent=2).encode('utf-8') + b'\n')
+        for r in results['results']:
+            for k in ('import', 'help'):
+                over = r[k]['min'] > r[k]['budget']
+                print('{:<30} {:<7} {:8.4f} s (budget {} s){}'
+                      .format(r['module'], k, r[k]['min'], r[k]['budget'],
+                              ' EXCEEDED' if over else ''), file=sys.stderr)
+        sys.exit(0 if results['ok'] else 1)
+    sizes = [int(s) for s in args['--sizes'].split(',')]
+    results = run(sizes, repeat=int(args['--repeat']),
+                  extract=not args['--no-extract'])
+    with open_output(target) as f:
+        f.write(json.dumps(results, indent=2).encode('utf-8') + b'\n')
+    if args['--baseline']:
+        with open(args['--baseline'], 'r') as f:
+            baseline = json.load(f)
+        for size, stage, now, then, ratio in compare(results, baseline):
+            print('{:>7} {:<11} {:10.6f} s {:10.6f} s {:6.2f}'
+                  .format(size, stage, now, then, ratio), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+# _*_ coding: utf-8 _*_
+
+''' Persistent cache of CKAN package metadata (package_show results).
+
+The cache is a SQLite file. Entries are keyed by the CKAN server, the
+package name and the package's metadata_modified. For every package
+only the most recent version is kept.
+
+Lookups:
+  + get(server, name, metadata_modified) returns the entry only if it
+    has exactly that metadata_modified (e.g. known from package_search).
+    A hit confirms that the entry is current, so it counts as fetched
+    anew for the <ttl>.
+  + get(server, name) returns the entry if it was fetched (or confirmed)
+    less than <ttl> seconds ago, or regardless of its age if the cache
+    is offline.
+
+The cache is limited to <max_bytes> of (json-encoded) metadata; the
+least recently used entries are evicted first. Entries neither fetched
+nor confirmed within <ttl> are dropped on eviction unless the cache is
+offline.
+
+With offline=True, fetch() never calls the server and raises CacheMiss
+for packages that are not cached.
+
+'''
+
+import os
+import time
+import sqlite3
+
+from mkdcxml import codec
+
+DEFAULT_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'mkdcxml',
+                            'ckanmeta.sqlite')
+
+
+class CacheMiss(LookupError):
+    pass
+
+
+class MetaCache:
+
+    def __init__(self, path=DEFAULT_PATH, max_bytes=256 * 2**20,
+                 ttl=24 * 3600, offline=False):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.offline = offline
+        dirname = os.path.dirname(os.path.abspath(path))
+        os.makedirs(dirname, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute('''CREATE TABLE IF NOT EXISTS ckanmeta (
+                             server TEXT, name TEXT, metadata_modified TEXT,
+                             fetched REAL, accessed REAL, size INTEGER,
+                             data BLOB,
+                             PRIMARY KEY (server, name))''')
+        self.db.execute('''CREATE INDEX IF NOT EXISTS ckanmeta_accessed
+                           ON ckanmeta (accessed)''')
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def _server(server):
+        return server.rstrip('/')
+
+    def get(self, server, name, metadata_modified=None):
+        'Returns the cached metadata of package <name>, or None.'
+        row = self.db.execute(
+            'SELECT metadata_modified, fetched, data FROM ckanmeta'
+            ' WHERE server = ? AND name = ?',
+            (self._server(server), name)).fetchone()
+        if row is None:
+            return None
+        modified, fetched, data = row
+        now = time.time()
+        if metadata_modified is not None:
+            if modified != metadata_modified:
+                return None
+            # the entry is current as of now
+            fetched = now
+        elif not self.offline and now - fetched > self.ttl:
+            return None
+        self.db.execute('UPDATE ckanmeta SET fetched = ?, accessed = ?'
+                        ' WHERE server = ? AND name = ?',
+                        (fetched, now, self._server(server), name))
+        self.db.commit()
+        return codec.loads(data)
+
+    def put(self, server, name, meta):
+        'Stores the metadata <meta> of package <name>.'
+        data = codec.dumps(meta)
+        now = time.time()
+        self.db.execute(
+            'INSERT OR REPLACE INTO ckanmeta VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (self._server(server), name, meta.get('metadata_modified'),
+             now, now, len(data), data))
+        self.db.commit()
+        self.evict()
+
+    def evict(self):
+        'Drops expired entries, then LRU entries until within max_bytes.'
+        if not self.offline:
+            self.db.execute('DELETE FROM ckanmeta WHERE fetched < ?',
+                            (time.time() - self.ttl,))
+        total = self.db.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM ckanmeta').fetchone()[0]
+        if total > self.max_bytes:
+            rows = self.db.execute('SELECT server, name, size FROM ckanmeta'
+                                   ' ORDER BY accessed')
+            drop = []
+            for server, name, size in rows:
+                if total <= self.max_bytes:
+                    break
+                drop.append((server, name))
+                total -= size
+            self.db.executemany('DELETE FROM ckanmeta'
+                                ' WHERE server = ? AND name = ?', drop)
+        self.db.commit()
+
+    def fetch(self, server, name, fetch, metadata_modified=None):
+        '''Returns the metadata of package <name> from the cache, or
+        calls fetch(name) to get it from the server and caches it.
+
+        '''
+        meta = self.get(server, name, metadata_modified)
+        if meta is not None:
+            return meta
+        if self.offline:
+            raise CacheMiss('Package "{}" from {} is not cached'
+                            .format(name, server))
+        meta = fetch(name)
+        self.put(server, name, meta)
+        return meta
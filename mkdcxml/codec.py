@@ -0,0 +1,102 @@
+# _*_ coding: utf-8 _*_
+
+''' JSON codec for the node-object json.
+
+Reading and writing the intermediate json goes through the codec
+returned by get_codec(). If orjson (https://github.com/ijl/orjson) is
+installed it is used, else the json module of the standard library.
+The backend can be forced with the environment variable MKDCXML_JSON
+("orjson" or "stdlib").
+
+Both backends write the same bytes: compact separators, UTF-8 without
+escaping of non-ASCII characters. (This holds for everything that
+appears in node-objects - strings, lists, objects, integers, booleans
+and null. Floats in exponent notation are formatted differently.)
+
+Objects with a to_json() method (mkdcxml.node.Node) are encoded as
+what it returns.
+
+'''
+
+import os
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(obj):
+    'Encodes the objects json does not know (Nodes).'
+    to_json = getattr(obj, 'to_json', None)
+    if to_json is None:
+        raise TypeError('Object of type {} is not JSON serializable'
+                        .format(type(obj).__name__))
+    return to_json()
+
+
+class StdlibCodec:
+
+    name = 'stdlib'
+
+    def loads(self, s):
+        'Decodes json from str or bytes.'
+        return json.loads(s)
+
+    def dumps(self, obj):
+        'Encodes <obj> to UTF-8 encoded json bytes.'
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':'),
+                          default=_default).encode('utf-8')
+
+
+class OrjsonCodec:
+
+    name = 'orjson'
+
+    def loads(self, s):
+        'Decodes json from str or bytes.'
+        return orjson.loads(s)
+
+    def dumps(self, obj):
+        'Encodes <obj> to UTF-8 encoded json bytes.'
+        return orjson.dumps(obj, default=_default)
+
+
+def get_codec(name=None):
+    '''Returns the codec <name> ("orjson" or "stdlib"). Default is the
+    value of MKDCXML_JSON, or the fastest available one.
+
+    '''
+    name = name or os.environ.get('MKDCXML_JSON')
+    if name == 'stdlib':
+        return StdlibCodec()
+    if name == 'orjson' or (name is None and orjson is not None):
+        if orjson is None:
+            raise ImportError('JSON codec "orjson" requested, but orjson'
+                              ' is not installed')
+        return OrjsonCodec()
+    if name is None:
+        return StdlibCodec()
+    raise ValueError('Unknown JSON codec "{}"'.format(name))
+
+
+codec = get_codec()
+
+
+def load(f):
+    'Reads json from the open file <f> (text or binary).'
+    return codec.loads(f.read())
+
+
+def loads(s):
+    return codec.loads(s)
+
+
+def dump(obj, f):
+    'Writes <obj> as json to the open binary file <f>.'
+    f.write(codec.dumps(obj))
+
+
+def dumps(obj):
+    return codec.dumps(obj)
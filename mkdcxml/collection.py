@@ -0,0 +1,136 @@
+# _*_ coding: utf-8 _*_
+
+''' Many DataCite <resource> records in one XML document.
+
+CollectionWriter writes the records one after the other to a single
+output stream, inside an envelope:
+
+  collection   <collection><resource>...</resource>...</collection>
+  oai          an OAI-PMH ListRecords response (metadataPrefix
+               "datacite"), each record with a header giving its
+               identifier ("doi:<DOI>") and datestamp.
+
+Each record is written as soon as it is added and not kept, so the
+memory used does not depend on the number of records. Records that
+were validated and failed are not written.
+
+    with CollectionWriter('export.xml', envelope='oai') as cw:
+        for meta in records:
+            cw.add(MetaDataWriter(meta))
+
+'''
+
+from datetime import datetime, timezone
+from contextlib import ExitStack
+
+from lxml import etree as ET
+
+from mkdcxml.mkdcxml import DATACITE_NS, XSI_NS
+from mkdcxml.output import open_output
+
+OAI_NS = 'http://www.openarchives.org/OAI/2.0/'
+OAI_SCHEMA_LOCATION = ('http://www.openarchives.org/OAI/2.0/'
+                       ' http://www.openarchives.org/OAI/2.0/OAI-PMH.xsd')
+OAI_METADATA_PREFIX = 'datacite'
+ENVELOPES = ('collection', 'oai')
+
+
+class CollectionWriter:
+
+    def __init__(self, target=None, envelope='collection', compress=False,
+                 atomic=True, base_url=''):
+        '''<target> is a path, a binary file object or None (stdout), see
+        output.open_output. <base_url> is the base URL of the OAI-PMH
+        repository (envelope "oai").
+
+        '''
+        if envelope not in ENVELOPES:
+            raise ValueError('envelope must be one of {}, got {!r}'
+                             .format(ENVELOPES, envelope))
+        self.target = target
+        self.envelope = envelope
+        self.compress = compress
+        self.atomic = atomic
+        self.base_url = base_url
+        self.count = 0
+        self.rejected = 0
+        self._stack = None
+        self._xf = None
+
+    def __enter__(self):
+        stack = ExitStack()
+        try:
+            f = stack.enter_context(open_output(self.target,
+                                                compress=self.compress,
+                                                atomic=self.atomic))
+            xf = stack.enter_context(ET.xmlfile(f, encoding='utf-8'))
+            xf.write_declaration()
+            self._open_envelope(stack, xf)
+        except BaseException:
+            stack.close()
+            raise
+        self._stack, self._xf = stack, xf
+        return self
+
+    def __exit__(self, *exc):
+        stack, self._stack, self._xf = self._stack, None, None
+        return stack.__exit__(*exc)
+
+    def _open_envelope(self, stack, xf):
+        if self.envelope == 'collection':
+            stack.enter_context(xf.element('collection'))
+            return
+        now = datetime.now(timezone.utc)
+        self._datestamp = now.strftime('%Y-%m-%d')
+        stack.enter_context(xf.element(
+            'OAI-PMH', {'{{{}}}schemaLocation'.format(XSI_NS):
+                        OAI_SCHEMA_LOCATION},
+            nsmap={None: OAI_NS, 'xsi': XSI_NS}))
+        self._leaf(xf, 'responseDate', now.strftime('%Y-%m-%dT%H:%M:%SZ'))
+        self._leaf(xf, 'request', self.base_url,
+                   {'verb': 'ListRecords',
+                    'metadataPrefix': OAI_METADATA_PREFIX})
+        stack.enter_context(xf.element('ListRecords'))
+
+    @staticmethod
+    def _leaf(xf, tag, text, att=None):
+        el = ET.Element(tag, att or {})
+        el.text = text
+        xf.write(el)
+
+    def add(self, mdw, identifier=None):
+        '''Writes the record of the MetaDataWriter <mdw> (see
+        MetaDataWriter.write_element), unless its validation failed.
+        <identifier> (the DOI) is used for the OAI-PMH header; default
+        is the identifier in the tree. Returns True if the record was
+        written.
+
+        '''
+        if self._xf is None:
+            raise ValueError('CollectionWriter is not open')
+        if mdw.valid is False:
+            self.rejected += 1
+            return False
+        xf = self._xf
+        with mdw.timings.stage('write'):
+            if self.envelope == 'oai':
+                with xf.element('record'):
+                    with xf.element('header'):
+                        self._leaf(xf, 'identifier',
+                                   self._oai_identifier(mdw, identifier))
+                        self._leaf(xf, 'datestamp', self._datestamp)
+                    with xf.element('metadata'):
+                        mdw.write_element(xf)
+            else:
+                mdw.write_element(xf)
+            xf.flush()
+        self.count += 1
+        return True
+
+    def _oai_identifier(self, mdw, identifier=None):
+        if identifier is None and mdw.root is not None:
+            identifier = mdw.root.findtext('{{{}}}identifier'
+                                           .format(DATACITE_NS))
+        if identifier:
+            return 'doi:{}'.format(identifier.strip())
+        return 'record-{}'.format(self.count + 1)
@@ -0,0 +1,285 @@
+# _*_ coding: utf-8 _*_
+
+'''ckanharvest
+
+Usage:
+  ckanharvest [-s <hosturl>] [--organization=<org>] [--tag=<tag>]
+              [-q <query>] [-j <workers>] [--retries=<n>] [--rows=<rows>]
+              [--dois=<doimap>] [--affils=<affilmap>] [--orcids=<orcids>]
+              [--project] [-d <outdir>] [--json] [--pretty] [--async]
+              [--cache=<cachefile>] [--state=<statefile>]
+              [--authors=<authorsdb>] [--unresolved=<report>]
+              [--resource-type=<type>] [--resource-type-general=<general>]
+              [--resource-version=<version>]
+  ckanharvest -h
+
+Options:
+  --server, -s <hosturl>     The url of the CKAN instance.
+                             [default: https://data.eawag.ch]
+  --organization=<org>       Harvest the packages of organization <org>.
+  --tag=<tag>                Harvest the packages tagged <tag>.
+  --query, -q <query>        Solr query for package_search. [default: *:*]
+  --jobs, -j <workers>       Number of concurrent package_show requests.
+                             [default: 8]
+  --retries=<n>              Retries of a failed request. [default: 3]
+  --rows=<rows>              Page size for package_search. [default: 100]
+  --dois=<doimap>            JSON file that maps package names to DOIs.
+                             Else, the "doi" field of the package is used.
+                             Packages without DOI are skipped.
+  --affils=<affilmap>        See ckanextract.
+  --orcids=<orcids>          See ckanextract.
+  --project                  The packages are CKAN projects
+                             (see ckanextract_project).
+  --outdir, -d <outdir>      Directory for the XML files. [default: .]
+  --json                     Also write the intermediate json.
+  --pretty                   Pretty-print the XML.
+  --async                    Fetch the packages with the asyncio client
+                             (see aioclient; requires aiohttp).
+  --cache=<cachefile>        Cache CKAN metadata in <cachefile>. Packages
+                             whose metadata_modified is unchanged are not
+                             fetched again (see mkdcxml.cache).
+  --state=<statefile>        Incremental run: convert only packages that
+                             changed since the last run recorded in
+                             <statefile> (see mkdcxml.state).
+  --authors=<authorsdb>      Look up ORCIDs and affiliations in the author
+                             store <authorsdb> (see mkdcxml.authors),
+                             without asking.
+  --unresolved=<report>      Write authors not found in <authorsdb> to
+                             <report> (json). [default: -]
+  --resource-type=<type>     ResourceType of the packages. Else, the
+                             default of the mapping.
+  --resource-type-general=<general>
+                             ResourceTypeGeneral of the packages. Else,
+                             the default of the mapping.
+  --resource-version=<version>
+                             Version of the packages. Else, the default
+                             of the mapping.
+  --help, -h                 Show this screen
+
+This module harvests many packages from a CKAN instance and converts
+them to DataCite XML. The packages are enumerated with (paginated)
+package_search, then fetched with package_show by a bounded pool of
+threads sharing one pooled HTTP session. Failed requests are retried
+with exponential backoff. The package metadata is fed to the mapping
+of ckanextract (or ckanextract_project) and converted in
+memory (see pipeline).
+
+A harvest runs unattended: nothing is asked. ResourceType and version
+are taken from the options above or the defaults of the mapping, and
+authors not in <affilmap>, <orcids> or <authorsdb> get neither ORCID
+nor affiliation. A package that cannot be fetched or converted is
+reported and counted (exit status 1); the others are converted anyway.
+
+'''
+
+import os
+import sys
+import json
+import time
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from docopt import docopt
+
+from mkdcxml import codec
+from mkdcxml.cache import MetaCache
+from mkdcxml.authors import AuthorStore, report_unresolved
+from mkdcxml.state import StateIndex, node_hash
+from mkdcxml.jsonl import outname
+from mkdcxml.output import open_output
+
+
+@lru_cache(maxsize=None)
+def permanent_errors():
+    '''The errors that are not going to go away by asking again (built on
+    first use: ckanapi and requests are slow to import, and --help needs
+    neither).
+
+    '''
+    import ckanapi
+    return (ckanapi.NotFound, ckanapi.NotAuthorized,
+            ckanapi.ValidationError, ckanapi.SearchQueryError,
+            ckanapi.ServerIncompatibleError)
+
+
+class Harvester:
+
+    def __init__(self, server, apikey=None, workers=8, retries=3,
+                 backoff=0.5, rows=100):
+        import ckanapi
+        import requests
+        self.server = server
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.rows = rows
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+                                                pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.conn = ckanapi.RemoteCKAN(server, apikey=apikey,
+                                       session=self.session)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def call(self, action, data):
+        'call_action with retries and exponential backoff.'
+        import ckanapi
+        import requests
+        for attempt in range(self.retries + 1):
+            try:
+                return self.conn.call_action(action, data)
+            except permanent_errors():
+                raise
+            except (ckanapi.CKANAPIError, requests.RequestException):
+                if attempt == self.retries:
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+
+    @staticmethod
+    def filter_query(organization=None, tag=None):
+        fq = []
+        if organization:
+            fq.append('organization:"{}"'.format(organization))
+        if tag:
+            fq.append('tags:"{}"'.format(tag))
+        return ' AND '.join(fq)
+
+    def search(self, q='*:*', organization=None, tag=None):
+        'Yields the package summaries (package_search results), page by page.'
+        fq = self.filter_query(organization, tag)
+        start = 0
+        while True:
+            data = {'q': q, 'rows': self.rows, 'start': start,
+                    'include_private': True}
+            if fq:
+                data['fq'] = fq
+            page = self.call('package_search', data)
+            results = page['results']
+            yield from results
+            start += len(results)
+            if not results or start >= page['count']:
+                break
+
+    def show(self, name):
+        'Returns (name, package_show result) or (name, exception).'
+        try:
+            return name, self.call('package_show', {'id': name})
+        except Exception as e:
+            return name, e
+
+    def fetch(self, names):
+        '''Fetches the packages <names> concurrently. Yields (name, meta),
+        where meta is an exception if the package could not be fetched.
+
+        '''
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            yield from pool.map(self.show, names)
+
+
+def apikey(project=False):
+    'The API key the extractors use.'
+    from mkdcxml.pipeline import extractor_class
+    return extractor_class(project).apikey()
+
+
+def main():
+    # imported here: pipeline imports the extractors only when needed
+    from mkdcxml.pipeline import ckan_to_xml, answers_of
+
+    args = docopt(__doc__, argv=sys.argv[1:])
+    outdir = args['--outdir']
+    os.makedirs(outdir, exist_ok=True)
+    dois = json.load(open(args['--dois'], 'r')) if args['--dois'] else {}
+    project = args['--project']
+    authors = AuthorStore(args['--authors']) if args['--authors'] else None
+    answers = answers_of(args)
+    failed = 0
+    with Harvester(args['--server'], apikey=apikey(project),
+                   workers=int(args['--jobs']),
+                   retries=int(args['--retries']),
+                   rows=int(args['--rows'])) as h:
+        summaries = list(h.search(q=args['--query'],
+                                  organization=args['--organization'],
+                                  tag=args['--tag']))
+        print('Found {} packages'.format(len(summaries)))
+        state = StateIndex(args['--state']) if args['--state'] else None
+        if state is not None:
+            summaries = state.changed(h.server, summaries)
+            print('{} packages changed since last run'.format(len(summaries)))
+        cache = MetaCache(args['--cache']) if args['--cache'] else None
+        cached = {}
+        if cache is not None:
+            for p in summaries:
+                meta = cache.get(h.server, p['name'], p['metadata_modified'])
+                if meta is not None:
+                    cached[p['name']] = meta
+            print('{} packages unchanged in cache'.format(len(cached)))
+        names = [p['name'] for p in summaries if p['name'] not in cached]
+        if args['--async']:
+            from mkdcxml.aioclient import fetch_packages
+            fetched = fetch_packages(
+                {h.server: (apikey(project), names)},
+                concurrency=h.workers, retries=h.retries)[h.server]
+        else:
+            fetched = h.fetch(names)
+        if cache is not None:
+            fetched = list(fetched)
+            for name, meta in fetched:
+                if not isinstance(meta, Exception):
+                    cache.put(h.server, name, meta)
+            fetched += list(cached.items())
+        for n, (name, meta) in enumerate(fetched, 1):
+            if isinstance(meta, Exception):
+                print('{}: fetch failed: {}: {}'
+                      .format(name, type(meta).__name__, meta))
+                failed += 1
+                continue
+            doi = dois.get(name) or meta.get('doi')
+            if not doi:
+                print('{}: no DOI, skipped'.format(name))
+                continue
+            try:
+                conv = ckan_to_xml(name, doi, args['--server'],
+                                   affils=args['--affils'],
+                                   orcids=args['--orcids'], project=project,
+                                   pretty_print=args['--pretty'],
+                                   ckanmeta=meta, authors=authors,
+                                   answers=answers)
+            except Exception as e:
+                print('{}: error: {}: {}'.format(name, type(e).__name__, e))
+                failed += 1
+                continue
+            xmlfile = outname(conv.meta, n, outdir)
+            known = state.get(h.server, name) if state is not None else None
+            if (known and known[2] == node_hash(conv.meta)
+                    and os.path.exists(xmlfile)):
+                # metadata_modified changed, but nothing we use
+                print('{}: unchanged'.format(name))
+            else:
+                with open_output(xmlfile) as f:
+                    f.write(conv.xml)
+                if args['--json']:
+                    jsonfile = os.path.splitext(xmlfile)[0] + '.json'
+                    with open_output(jsonfile) as f:
+                        codec.dump(conv.meta, f)
+                print('{}: {}'.format(name, conv.validation))
+            if not conv.validation.valid:
+                failed += 1
+            elif state is not None:
+                state.record(h.server, name, doi, meta['metadata_modified'],
+                             conv.meta)
+    if authors is not None:
+        report_unresolved(authors, args['--unresolved'])
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
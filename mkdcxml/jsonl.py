@@ -0,0 +1,155 @@
+# _*_ coding: utf-8 _*_
+
+''' Conversion of a JSON Lines (NDJSON) stream of metadata records.
+
+Each non-empty line of the input holds one complete node-object
+({"resource": [...]}). The records are converted one after the other,
+so memory use does not grow with the length of the stream. Each XML is
+written to a file named after the value of the record's "identifier"
+node (with "/" replaced by "_"), e.g. 10.25678_000011.xml, or they are
+all appended to one collection file (see mkdcxml.collection). Records
+keep the schema version they declare, unless another is requested
+(they are then transformed, see MetaDataWriter.to_version).
+
+'''
+
+import os
+import re
+import sys
+import time
+from contextlib import nullcontext, ExitStack
+
+from mkdcxml import codec
+from mkdcxml.mkdcxml import MetaDataWriter, stream_writer, typ_of
+from mkdcxml.node import Node
+from mkdcxml.collection import CollectionWriter
+from mkdcxml.batch import summarize, report
+from mkdcxml.timing import Timings, NULL_TIMINGS, Profiler
+
+
+def identifier_of(meta):
+    'Returns the text of the "identifier" node of a record, or None.'
+    if isinstance(meta, Node):
+        ident = meta.find('identifier')
+        return ident.val if ident is not None else None
+    root = next(iter(meta.values()), [])
+    if isinstance(root, dict):
+        root = root.get('children', [])
+    for node in root:
+        ident = node.get('identifier') if isinstance(node, dict) else None
+        if ident is not None:
+            return ident.get('val') if isinstance(ident, dict) else ident
+    return None
+
+
+def outname(meta, lineno, outdir):
+    'Returns the XML file name for a record.'
+    ident = identifier_of(meta)
+    if ident:
+        base = re.sub(r'[/\\:\s]+', '_', ident.strip())
+    else:
+        base = 'record-{}'.format(lineno)
+    return os.path.join(outdir, base + '.xml')
+
+
+def convert_record(meta, outfile, validate=True, stream=False,
+                   timings=None, collection=None, typ='auto'):
+    '''Converts one decoded record to schema version <typ> ("auto": the
+    version the record declares) and writes it to <outfile>, or adds it
+    to the CollectionWriter <collection>. Returns its status record.
+
+    '''
+    record = {'output': outfile}
+    if stream:
+        mdw = stream_writer(meta, typ, timings=timings)
+    else:
+        mdw = MetaDataWriter(meta, typ='auto', validate='skip',
+                             timings=timings).to_version(
+            typ, validate='eager' if validate else 'skip')
+    if collection is not None:
+        if not collection.add(mdw, identifier_of(meta)):
+            record['output'] = None
+    elif stream:
+        mdw.streamxml(outfile)
+    else:
+        mdw.writexml(outfile)
+    if mdw.validation is None:
+        record['status'] = 'unchecked'
+    else:
+        record['status'] = 'passed' if mdw.valid else 'failed'
+        record['errors'] = mdw.validation.as_dict()['errors']
+    return record
+
+
+def convert_stream(f, outdir='.', validate=True, stream=False, name='-',
+                   timed=False, profiler=None, collection=None, typ='auto'):
+    """Converts all records in the open (binary) file <f>, one line at a
+    time. Returns a list of records describing the outcome for each line.
+    <timed> requests per-stage timings, <profiler> is a timing.Profiler,
+    <collection> a CollectionWriter to add the records to (instead of
+    writing one file each), <typ> the schema version (see convert_record).
+
+    """
+    os.makedirs(outdir, exist_ok=True)
+    results = []
+    for n, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        timings = Timings() if timed else None
+        profile = (profiler.profile(os.path.join(outdir,
+                                                 'record-{}'.format(n)))
+                   if profiler is not None else nullcontext())
+        dumps = len(profiler.dumps) if profiler is not None else 0
+        start = time.perf_counter()
+        try:
+            with profile:
+                with (timings or NULL_TIMINGS).stage('readmeta'):
+                    meta = codec.loads(line)
+                outfile = (outname(meta, n, outdir) if collection is None
+                           else collection.target)
+                record = convert_record(meta, outfile,
+                                        validate=validate, stream=stream,
+                                        timings=timings,
+                                        collection=collection, typ=typ)
+        except Exception as e:
+            record = {'status': 'error',
+                      'error': '{}: {}'.format(type(e).__name__, e)}
+        record['input'] = '{}:{}'.format(name, n)
+        record['seconds'] = time.perf_counter() - start
+        if timings is not None:
+            record['timings'] = timings.as_dict()
+        if profiler is not None and len(profiler.dumps) > dumps:
+            record['profile'] = profiler.dumps[-1]
+        results.append(record)
+    return results
+
+
+def main(args):
+    'Entry point for "mkdcxml jsonl". <args> are the parsed docopt arguments.'
+    infile = args['<jsonlfile>']
+    outdir = args['--outdir'] or '.'
+    if args['--tracemalloc']:
+        import tracemalloc
+        tracemalloc.start()
+    profiler = (Profiler(float(args['--profile']),
+                         'tracemalloc' if args['--tracemalloc']
+                         else 'cprofile')
+                if args['--profile'] else None)
+    options = dict(timed=args['--timings'], profiler=profiler,
+                   typ=typ_of(args['--schema'] or 'auto'))
+    start = time.perf_counter()
+    with ExitStack() as stack:
+        if args['--collection']:
+            options['collection'] = stack.enter_context(CollectionWriter(
+                args['--collection'],
+                envelope='oai' if args['--oai'] else 'collection',
+                compress=args['--gzip']))
+        if infile and infile != '-':
+            f = stack.enter_context(open(infile, 'rb'))
+        else:
+            f, infile = sys.stdin.buffer, '<stdin>'
+        results = convert_stream(f, outdir, not args['--no-validate'],
+                                 args['--stream'], name=infile, **options)
+    summary = summarize(results, time.perf_counter() - start,
+                        args['--summary'])
+    return report(summary)
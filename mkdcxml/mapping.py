@@ -0,0 +1,490 @@
+# _*_ coding: utf-8 _*_
+
+''' Declarative mapping of CKAN metadata to DataCite node-objects.
+
+The mapping for a kind of CKAN package (data package, project) is a
+list of sections, in the order of the DataCite elements:
+
+    (section, transform, params)
+
+<transform> names a function in TRANSFORMS, which is called with the
+extractor (see BaseExtract) and <params> as keyword arguments. It
+returns the node of the section (a mkdcxml.node.Node), or None if there
+is nothing to add. Sections with transform None are not implemented.
+
+compile_mapping() turns a mapping into a Plan - a list of ready-to-call
+functions - once. Plan.apply() runs it for one package, so many
+packages can be extracted without looking anything up per package.
+
+The extractors ckanextract and ckanextract_project are BaseExtract
+with their mapping (DATASET_MAPPING, PROJECT_MAPPING).
+
+'''
+
+import os
+import re
+import json
+from functools import partial, lru_cache
+from datetime import datetime
+
+from mkdcxml import codec
+from mkdcxml.authors import parse_author
+from mkdcxml.node import Node
+from mkdcxml.timing import NULL_TIMINGS
+
+PUBLISHER = 'Eawag: Swiss Federal Institute of Aquatic Science and Technology'
+DEFAULT_AFFILIATION = 'Eawag: Swiss Federal Institute of Aquatic Science and Technology'
+
+RESOURCE_TYPES_GENERAL = ['Audiovisual', 'Collection', 'Dataset', 'Image',
+                          'Model', 'Software', 'Sound', 'Text', 'Other']
+
+SOLR_RANGE = re.compile(r'\s+TO\s+')
+LINEBREAK = re.compile(r'\s*\r\n')
+RELATION_TYPES = re.compile(r'relationTypes:\s*')
+RELATED_ID_TYPE = re.compile(r'relatedIdentifierType:\s*')
+
+
+# Helpers
+
+def date_from_iso(isodate):
+    return datetime.strptime(isodate, '%Y-%m-%dT%H:%M:%S.%f')
+
+
+def converttime(solrtimerange):
+    # Converts SOLR date & daterange - format to RKMS-ISO8601
+    if SOLR_RANGE.search(solrtimerange):
+        fro, to = solrtimerange.split('TO')
+        fro = fro.strip()
+        fro = '' if fro == '*' else fro
+        to = to.strip()
+        to = '' if to == '*' else to
+        return '{}/{}'.format(fro, to)
+    else:
+        isotimerange = '/' if solrtimerange.strip() == '*' else solrtimerange.strip()
+        return isotimerange
+
+
+def description_parse(desc):
+    # creates a list of br-elements (<children>) with appropriate tails
+    # and a string <text>, representing the text-value of the parent.
+    texts = desc.split('\r\n')
+    text = texts.pop(0)
+    children = [Node('br', val='', tail=t) for t in texts]
+    return (text, children)
+
+
+@lru_cache(maxsize=32)
+def load_json(filename):
+    'Reads a json file (affiliations, ORCIDs, ...) once per process.'
+    with open(filename, 'r') as f:
+        return json.load(f)
+
+
+# Transforms
+
+def constant(ex, node):
+    # The same Node is returned for every package; don't mutate it.
+    return node
+
+
+def identifier(ex, identifierType):
+    return Node('identifier', val=ex.doi,
+                att={'identifierType': identifierType})
+
+
+def creators(ex, default_affiliation):
+    creators = Node('creators', children=[])
+    for a in ex.ckanmeta['author']:
+        last, rest, email = parse_author(a)
+        fullname = '{}, {}'.format(last, rest)
+        if ex.authors is not None:
+            author = ex.authors.resolve(last, rest, email,
+                                        context=ex.pkgname) or {}
+            orcid = author.get('orcid')
+            affiliation = author.get('affiliation')
+        else:
+            if not ex.orcids:
+                orcid = ex.ask('orcid', 'Author: |{}| email:|{}| : ORCID: '
+                               .format(fullname, email))
+            else:
+                try:
+                    orcid = ex.orcids[fullname]
+                    print('Found ORCID {} for "{}"'.format(orcid, fullname))
+                except KeyError:
+                    orcid = None
+            if not ex.affils and ex.answers is None:
+                eawag = input('{}: Affiliation Eawag? [Y/n]'.format(fullname))
+                eawag = True if eawag in ['', 'Y', 'y', '1'] else False
+                affiliation = default_affiliation if eawag else None
+            elif not ex.affils:
+                # unattended: don't assume an affiliation
+                affiliation = None
+            else:
+                try:
+                    affiliation = ex.affils[fullname]
+                    print('Found affiliation "{}" for "{}"'
+                          .format(affiliation, fullname))
+                except KeyError:
+                    affiliation = None
+
+        creator = [
+            Node('creatorName', val=fullname, att={'nameType': 'Personal'}),
+            Node('givenName', val=rest),
+            Node('familyName', val=last)
+        ]
+        if orcid:
+            creator.append(
+                Node('nameIdentifier', val=orcid,
+                     att={'nameIdentifierScheme': 'ORCID',
+                          'schemeURI': 'https://orcid.org/'}))
+        if affiliation:
+            creator.append(Node('affiliation', val=affiliation))
+        creators.children.append(Node('creator', children=creator))
+    return creators
+
+
+def text_list(ex, field, container, element, att):
+    # e.g. <titles><title lang="en">{field}</title></titles>
+    return Node(container,
+                children=[Node(element, val=ex.ckanmeta[field], att=att)])
+
+
+def year(ex, field, element):
+    # We assume publication happened in the same year as metadata was created.
+    return Node(element, val=str(date_from_iso(ex.ckanmeta[field]).year))
+
+
+def prompt_resource_type(ex, default, default_general):
+    restype = ex.ask('resourceType', 'ResourceType [{}]: '.format(default))
+    restype = default if restype == '' else restype
+    restype_general = False
+    while not restype_general:
+        restype_general = ex.ask('resourceTypeGeneral',
+                                 'ResourceTypeGeneral [{}]'
+                                 '(Audiovisual, Dataset, Image, Model,'
+                                 ' Software, Sound, Text, Other) : '
+                                 .format(default_general))
+        restype_general = (default_general if restype_general == ''
+                           else restype_general)
+        if restype_general not in RESOURCE_TYPES_GENERAL:
+            if ex.answers is not None:
+                raise ValueError('Illegal ResourceTypeGeneral [{}]'
+                                 .format(restype_general))
+            print('Illegal ResourceTypeGeneral [{}]\n'.format(restype_general))
+            restype_general = False
+    return Node('resourceType', val=restype,
+                att={'resourceTypeGeneral': restype_general})
+
+
+def subjects(ex, fields, tags, exclude, lang):
+    # This has to be amended if subjects (keywords) are from
+    # a specific ontology. It also needs to change if
+    # CKAN metadata schema changes in any of the fields suitable
+    # as keywords
+    keywords = []
+    for f in fields:
+        keywords += ex.ckanmeta.get(f) or []
+    keywords += [t['display_name'] for t in ex.ckanmeta.get(tags) or []]
+    return Node('subjects', children=[
+        Node('subject', val=k, att={'lang': lang})
+        for k in keywords if k not in exclude])
+
+
+def dates(ex, submitted, collected):
+    # We interpret CKAN's 'metadata_modified' as 'Submitted',
+    # assuming that the last changes where made shortly before
+    # DOI creation was requested.
+    # The only other date(s) considered here are dateType=Collected
+    # Other dateTyps (https://schema.datacite.org/meta/kernel-4.1
+    # /include/datacite-dateType-v4.1.xsd) would have to be added.
+
+    # Also: Everything is UTC everywhere.
+    submitted = date_from_iso(ex.ckanmeta[submitted])
+    submitted = [Node('date', val=submitted.strftime('%Y-%m-%d'),
+                      att={'dateType': 'Submitted'})]
+    collected = [Node('date', val=converttime(t),
+                      att={'dateType': 'Collected'})
+                 for t in ex.ckanmeta.get(collected) or []]
+    return Node('dates', children=submitted + collected)
+
+
+def related_identifiers(ex):
+    # We scan the 'description' field of all resources
+    # for a simple custom format
+    relatedIdentifiers = []
+    for r in ex.ckanmeta['resources']:
+        lines = [l.strip() for l in LINEBREAK.split(r.get('description'))]
+        if lines[0] == 'relatedIdentifier':
+            rel_types = RELATION_TYPES.sub('', lines[2]).split(',')
+            rel_id_type = RELATED_ID_TYPE.sub('', lines[1]).strip()
+            relatedIdentifiers += [
+                Node('relatedIdentifier', val=r.get('url'),
+                     att={'resourceTypeGeneral': r.get('resource_type'),
+                          'relatedIdentifierType': rel_id_type,
+                          'relationType': rt.strip()}) for rt in rel_types]
+
+    if ex.related_identifiers_from_file:
+        relatedIdentifiers += [Node.from_json(n) for n in
+                               ex.related_identifiers_from_file]
+
+    if relatedIdentifiers:
+        return Node('relatedIdentifiers', children=relatedIdentifiers)
+
+
+def prompt_version(ex, default):
+    version = ex.ask('version', 'Version [{}]: '.format(default))
+    version = default if version == '' else version
+    return Node('version', val=version)
+
+
+def description(ex, field, descriptionType, lang):
+    text, children = description_parse(ex.ckanmeta[field])
+    return Node('descriptions', children=[
+        Node('description', val=text,
+             att={'descriptionType': descriptionType, 'lang': lang},
+             children=children)
+    ])
+
+
+def geolocations(ex, names, spatial):
+    # Currently only implemented:
+    # + geoLocationPoint
+    # + geoLocationPlace
+    # + geoLocation - MultiPoint
+    #
+    # Note that CKAN notation is lon/lat.
+    #
+    # Each geoLocation-feature (place, point) is one geoLocation.
+    # The spec seems to allow to accociate, say a geoname and a point,
+    # but we can't do that in CKAN anyway, and I don't really understand
+    # the XML (xs:choice).
+
+    def mk_point_location(lon, lat):
+        return Node('geoLocation', children=[
+            Node('geoLocationPoint', children=[
+                Node('pointLongitude', val=str(lon)),
+                Node('pointLatitude', val=str(lat))])])
+
+    geo_locations = [Node('geoLocation',
+                          children=[Node('geoLocationPlace', val=nam)])
+                     for nam in ex.ckanmeta.get(names) or []]
+
+    spatial = ex.ckanmeta.get(spatial)
+    spatial = json.loads(spatial) if spatial else None
+    if spatial:
+        if spatial['type'] == 'Point':
+            lon, lat = spatial['coordinates'][:2]
+            geo_locations.append(mk_point_location(lon, lat))
+        if spatial['type'] == 'MultiPoint':
+            for point in spatial['coordinates']:
+                geo_locations.append(mk_point_location(point[0], point[1]))
+
+    if geo_locations:
+        return Node('geoLocations', children=geo_locations)
+
+
+TRANSFORMS = {
+    'constant': constant,
+    'identifier': identifier,
+    'creators': creators,
+    'text_list': text_list,
+    'year': year,
+    'prompt_resource_type': prompt_resource_type,
+    'subjects': subjects,
+    'dates': dates,
+    'related_identifiers': related_identifiers,
+    'prompt_version': prompt_version,
+    'description': description,
+    'geolocations': geolocations,
+}
+
+
+# Mappings
+
+DATASET_MAPPING = [
+    ('identifier', 'identifier', {'identifierType': 'DOI'}),
+    ('creators', 'creators', {'default_affiliation': DEFAULT_AFFILIATION}),
+    ('titles', 'text_list', {'field': 'title', 'container': 'titles',
+                             'element': 'title', 'att': {'lang': 'en'}}),
+    ('publisher', 'constant', {'node': Node('publisher', val=PUBLISHER)}),
+    ('publicationYear', 'year', {'field': 'metadata_created',
+                                 'element': 'publicationYear'}),
+    ('resourceType', 'prompt_resource_type',
+     {'default': 'Publication Data Package', 'default_general': 'Collection'}),
+    ('subjects', 'subjects', {'fields': ['generic-terms', 'taxa',
+                                         'substances', 'systems'],
+                              'tags': 'tags', 'exclude': ['none'],
+                              'lang': 'en'}),
+    ('contributors', None, {}),
+    ('dates', 'dates', {'submitted': 'metadata_modified',
+                        'collected': 'timerange'}),
+    # We assume an anglophonic world
+    ('language', 'constant', {'node': Node('language', val='en')}),
+    ('alternateIdentifiers', None, {}),
+    ('relatedIdentifiers', 'related_identifiers', {}),
+    ('sizes', None, {}),
+    ('formats', None, {}),
+    ('version', 'prompt_version', {'default': '1.0'}),
+    ('rightslist', 'constant', {'node': Node.from_json({'rightsList': [
+        {'rights': {'val': 'CC0 1.0 Universal (CC0 1.0) '
+                    'Public Domain Dedication',
+                    'att': {'rightsURI': 'https://creativecommons.org/'
+                            'publicdomain/zero/1.0/',
+                            'lang': 'en'}}}]})}),
+    # We only consider descriptionType "Abstract"
+    ('descriptions', 'description', {'field': 'notes',
+                                     'descriptionType': 'Abstract',
+                                     'lang': 'en'}),
+    ('geolocations', 'geolocations', {'names': 'geographic_name',
+                                      'spatial': 'spatial'}),
+    ('fundingReferences', None, {}),
+]
+
+# Projects currently carry the same metadata as data packages.
+PROJECT_MAPPING = list(DATASET_MAPPING)
+
+
+class Plan:
+    'A compiled mapping: a list of (section, function of the extractor).'
+
+    def __init__(self, steps):
+        self.steps = steps
+
+    def apply(self, ex, timings=None):
+        '''Returns the Node for the package of extractor <ex>.
+        With <timings> (a Timings object) each section is timed as stage
+        "section:<section>".
+
+        '''
+        resource = []
+        if timings is None:
+            for section, step in self.steps:
+                node = step(ex)
+                if node is not None:
+                    resource.append(node)
+        else:
+            for section, step in self.steps:
+                with timings.stage('section:' + section):
+                    node = step(ex)
+                if node is not None:
+                    resource.append(node)
+        return Node('resource', children=resource)
+
+
+def compile_mapping(mapping):
+    'Compiles <mapping> into a Plan.'
+    steps = []
+    for section, transform, params in mapping:
+        if transform is None:
+            continue
+        fn = TRANSFORMS[transform]
+        steps.append((section, partial(fn, **params) if params else fn))
+    return Plan(steps)
+
+
+class BaseExtract:
+    '''Extracts the metadata of one CKAN package. Subclasses set
+    <mapping>, <plan> (compiled from <mapping>) and <apikey_variable>,
+    the environment variable that holds the CKAN API key.
+
+    '''
+
+    mapping = []
+    plan = Plan([])
+    apikey_variable = None
+
+    @classmethod
+    def elements(cls):
+        return [(i, m[0]) for i, m in enumerate(cls.mapping, 1)]
+
+    def __init__(self, pkgname, doi, outfile, server, affils=None,
+                 orcids=None, relids=None, ckanmeta=None, cache=None,
+                 authors=None, timings=None, answers=None):
+        self.pkgname = pkgname
+        self.server = server
+        self.cache = cache
+        # an AuthorStore; if given, ORCIDs and affiliations are looked up
+        # there and never asked for
+        self.authors = authors
+        # a dict; if given, the extraction is unattended: prompts take
+        # their answer from it ("resourceType", "resourceTypeGeneral",
+        # "version") or else their default, see ask()
+        self.answers = answers
+        # a Timings object, if the fetch and the sections are to be timed
+        self.timings = timings
+        # <ckanmeta> is the package_show result, if already fetched
+        if ckanmeta:
+            self.ckanmeta = ckanmeta
+        else:
+            with (timings or NULL_TIMINGS).stage('fetch'):
+                self.ckanmeta = self.get_ckanmeta(pkgname)
+        self.doi = doi
+        self.output = Node('resource', children=[])
+        self.outfile = outfile
+        self.affils = load_json(affils) if affils else None
+        self.orcids = load_json(orcids) if orcids else None
+        self.related_identifiers_from_file = (load_json(relids)
+                                              if relids else None)
+
+    def ask(self, key, prompt):
+        '''Returns the answer to <prompt>: input() if interactive, else
+        answers[<key>], or "" (the default) if not given.
+
+        '''
+        if self.answers is None:
+            return input(prompt)
+        return self.answers.get(key) or ''
+
+    @classmethod
+    def apikey(cls):
+        'The CKAN API key, read from the environment when needed.'
+        return os.environ[cls.apikey_variable]
+
+    def get_ckanmeta(self, pkgname):
+        if self.cache is None:
+            return self._package_show(pkgname)
+        if self.cache.offline:
+            return self.cache.fetch(self.server, pkgname, self._package_show)
+        # Online, the cached metadata is used only if it is current, as
+        # told by the metadata_modified of the package (package_search
+        # returns just that field, much less than package_show).
+        modified = self._metadata_modified(pkgname)
+        if modified is None:
+            meta = self._package_show(pkgname)
+            self.cache.put(self.server, pkgname, meta)
+            return meta
+        return self.cache.fetch(self.server, pkgname, self._package_show,
+                                metadata_modified=modified)
+
+    def _call_action(self, action, data):
+        # imported here, as ckanapi (and requests) are slow to import
+        import ckanapi
+        with ckanapi.RemoteCKAN(self.server, apikey=self.apikey()) as conn:
+            return conn.call_action(action, data)
+
+    def _package_show(self, pkgname):
+        return self._call_action('package_show', {'id': pkgname})
+
+    def _metadata_modified(self, pkgname):
+        '''Returns the metadata_modified of package <pkgname>, or None if
+        package_search does not find it.
+
+        '''
+        found = self._call_action('package_search', {
+            'q': 'name:"{}"'.format(pkgname),
+            'fl': 'name,metadata_modified',
+            'include_private': True})
+        for p in found['results']:
+            if p['name'] == pkgname:
+                return p['metadata_modified']
+        return None
+
+    def extract(self):
+        'Runs the plan and returns the Node (see mkdcxml.node).'
+        self.output = self.plan.apply(self, self.timings)
+        return self.output
+
+    def main(self):
+        self.extract()
+        with open(self.outfile, 'wb') as f_out:
+            codec.dump(self.output, f_out)
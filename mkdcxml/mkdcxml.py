@@ -36,56 +36,519 @@ The node does not have neither text nor attributes.
   + The value of "tail" is text that is directly inserted after the element.
     This serves to enable "mixed contenet" (see https://lxml.de/tutorial.html#elements-contain-text).
 
+In memory, the extractors represent node-objects more compactly as
+mkdcxml.node.Node objects, which MetaDataWriter takes as well.
+
 '''
 
-import pkg_resources
 import sys
-import json
+import threading
+from mkdcxml import codec
+from mkdcxml.node import Node
+from mkdcxml.output import open_output
+from mkdcxml.timing import Timings, NULL_TIMINGS
+from collections import namedtuple
 from docopt import docopt
 from lxml import etree as ET
-from lxml.builder import ElementMaker
+
+DATACITE_NS = 'http://datacite.org/schema/kernel-4'
+XML_NS = 'http://www.w3.org/XML/1998/namespace'
+XSI_NS = 'http://www.w3.org/2001/XMLSchema-instance'
+# prefixes declared for namespaced attributes when streaming (xml is
+# always bound, see _stream_tree)
+PREFIXES = {XSI_NS: 'xsi'}
+
+# The supported versions of the DataCite schema ("typ"): the XSD and
+# the location given in xsi:schemaLocation.
+VERSIONS = {
+    'datacite4.1': {
+        'xsd': 'schema/datacite/metadata_schema_4.1.xsd',
+        'location': 'http://schema.datacite.org/meta/kernel-4.1/metadata.xsd',
+    },
+    'datacite4.4': {
+        'xsd': 'schema/datacite/metadata_schema_4.4.xsd',
+        'location': 'http://schema.datacite.org/meta/kernel-4.4/metadata.xsd',
+    },
+}
+DEFAULT_TYP = 'datacite4.4'
+
+SCHEMA_FILES = {typ: v['xsd'] for typ, v in VERSIONS.items()}
+
+# Schemas the XSDs import from the web, and the bundled copies used instead
+LOCAL_SCHEMAS = {
+    'http://www.w3.org/2009/01/xml.xsd': 'schema/datacite/include/xml.xsd',
+}
+
+# XSLT transforms between versions, keyed by (from typ, to typ)
+TRANSFORMS = {
+    ('datacite4.4', 'datacite4.1'): 'schema/xslt/datacite4.4-to-4.1.xsl',
+    ('datacite4.1', 'datacite4.4'): 'schema/xslt/datacite4.1-to-4.4.xsl',
+}
+
+# Process-wide registries of compiled schemas (keyed by typ) and
+# transforms (keyed by (from typ, to typ)). They are filled lazily by
+# get_schema() and get_transform() and shared by all MetaDataWriter
+# instances. Compiling is thread-safe; validating is only through
+# validate_tree(), as the error_log of an XMLSchema belongs to the
+# schema, not to the call of validate().
+_schemas = {}
+_transforms = {}
+_schemas_lock = threading.Lock()
+# a lock per compiled schema, see validate_tree()
+_validation_locks = {}
+
+
+def typ_of(version):
+    '''Returns the typ for <version>, given as typ ("datacite4.1") or
+    version number ("4.1"). "auto" is returned as it is.
+
+    '''
+    if version == 'auto' or version in VERSIONS:
+        return version
+    typ = 'datacite{}'.format(version)
+    if typ not in VERSIONS:
+        raise ValueError('Unknown DataCite schema version "{}" (known: {})'
+                         .format(version, ', '.join(VERSIONS)))
+    return typ
+
+
+def detect_typ(meta, default=DEFAULT_TYP):
+    '''Returns the typ the node-object <meta> declares in the
+    xsi:schemaLocation attribute of its root node, else <default>.
+
+    '''
+    if isinstance(meta, Node):
+        att = dict(meta.att or ())
+    else:
+        k, v = next(iter(meta.items()))
+        att = (v.get('att') or {}) if isinstance(v, dict) else {}
+    for name in ('{{{}}}schemaLocation'.format(XSI_NS), 'xsi:schemaLocation',
+                 'schemaLocation'):
+        if name in att:
+            return typ_of_location(att[name], default)
+    return default
+
+
+def typ_of_location(schemalocation, default=DEFAULT_TYP):
+    'Returns the typ whose location appears in <schemalocation>.'
+    for typ, v in VERSIONS.items():
+        if v['location'] in schemalocation.split():
+            return typ
+    return default
+
+
+def resource(path):
+    'Returns the filename of the bundled <path>; use as a context manager.'
+    # imported here, as it is slow to import and only needed once
+    from importlib.resources import files, as_file
+    return as_file(files(__package__).joinpath(path))
+
+
+class LocalResolver(ET.Resolver):
+    'Resolves the URLs in LOCAL_SCHEMAS to the bundled files.'
+
+    def resolve(self, url, pubid, context):
+        path = LOCAL_SCHEMAS.get(url)
+        if path is not None:
+            with resource(path) as filename:
+                return self.resolve_filename(str(filename), context)
+
+
+def compile_schema(typ):
+    '''Compiles the XMLSchema for <typ> (a new instance on every call; see
+    get_schema()).
+
+    '''
+    parser = ET.XMLParser()
+    parser.resolvers.add(LocalResolver())
+    with resource(SCHEMA_FILES[typ]) as schemafile:
+        # parsed from the file, so that includes are found
+        return ET.XMLSchema(ET.parse(str(schemafile), parser))
+
+
+def get_schema(typ):
+    '''Returns the compiled XMLSchema for <typ>, compiling it on first use.
+    Returns None for unknown <typ>.
+
+    '''
+    schema = _schemas.get(typ)
+    if schema is not None or typ not in SCHEMA_FILES:
+        return schema
+    with _schemas_lock:
+        # another thread might have been faster
+        schema = _schemas.get(typ)
+        if schema is None:
+            schema = compile_schema(typ)
+            _schemas[typ] = schema
+    return schema
+
+
+def validate_tree(schema, root):
+    '''Validates the tree <root> against <schema> and returns the
+    ValidationResult. A schema keeps the errors of its last validation
+    in its error_log, so validating and reading the log are done under
+    a lock of the schema: threads sharing it validate one at a time
+    (use a schema per thread, see compile_schema(), to validate in
+    parallel).
+
+    '''
+    lock = _validation_locks.get(schema)
+    if lock is None:
+        with _schemas_lock:
+            lock = _validation_locks.setdefault(schema, threading.Lock())
+    with lock:
+        valid = schema.validate(root)
+        return ValidationResult.from_log(valid, schema.error_log)
+
+
+def get_transform(source, target):
+    '''Returns the compiled XSLT that transforms a tree of version
+    <source> to version <target>, compiling it on first use.
+
+    '''
+    key = (source, target)
+    transform = _transforms.get(key)
+    if transform is not None:
+        return transform
+    if key not in TRANSFORMS:
+        raise ValueError('No transform from {} to {}'.format(source, target))
+    with _schemas_lock:
+        transform = _transforms.get(key)
+        if transform is None:
+            with resource(TRANSFORMS[key]) as xslfile:
+                transform = ET.XSLT(ET.parse(str(xslfile)))
+            _transforms[key] = transform
+    return transform
+
+
+class NameCache:
+    '''Resolves json keys to tag names and attribute names of one schema.
+    Each name is resolved once and then looked up.
+
+    '''
+
+    def __init__(self, namespace, attribute_map):
+        self.namespace = namespace
+        self.attribute_map = attribute_map
+        self.tags = {}
+        self.attributes = {}
+
+    def tag(self, k):
+        try:
+            return self.tags[k]
+        except KeyError:
+            tag = k if k.startswith('{') else '{{{}}}{}'.format(self.namespace, k)
+            self.tags[k] = tag
+            return tag
+
+    def attribute(self, a):
+        try:
+            return self.attributes[a]
+        except KeyError:
+            name = self.attribute_map.get(a) or a
+            self.attributes[a] = name
+            return name
+
+
+# NameCaches, keyed by typ, shared by all MetaDataWriter instances.
+_name_caches = {}
+
+
+def prewarm(typs=None):
+    '''Compiles the schemas for <typs> (default: all known), and the
+    transforms between them, ahead of time.
+
+    '''
+    typs = typs or list(SCHEMA_FILES)
+    for typ in typs:
+        get_schema(typ)
+    for source, target in TRANSFORMS:
+        if source in typs and target in typs:
+            get_transform(source, target)
+
+
+ValidationError = namedtuple('ValidationError',
+                             ['line', 'column', 'path', 'level', 'type',
+                              'message'])
+
+
+class ValidationResult:
+    '''The outcome of validating a tree against a schema.
+    <errors> is a list of ValidationError, taken from the schema's error log.
+
+    '''
+
+    def __init__(self, valid, errors=None):
+        self.valid = valid
+        self.errors = errors or []
+
+    @classmethod
+    def from_log(cls, valid, error_log):
+        errors = [ValidationError(e.line, e.column, e.path, e.level_name,
+                                  e.type_name, e.message)
+                  for e in error_log]
+        return cls(valid, errors)
+
+    def __bool__(self):
+        return self.valid
+
+    def __str__(self):
+        lines = ['Validation passed: {}'.format(self.valid)]
+        lines += ['{}:{}:{}:{}: {}'.format(e.path, e.line, e.level, e.type,
+                                           e.message)
+                  for e in self.errors]
+        return '\n'.join(lines)
+
+    def as_dict(self):
+        return {'valid': self.valid,
+                'errors': [e._asdict() for e in self.errors]}
+
+
+# Validation modes of MetaDataWriter:
+#  eager:    validate right after the tree is built
+#  deferred: validate on first access of .validation / .valid
+#  skip:     don't validate (unless .validate() is called explicitly)
+VALIDATION_MODES = ('eager', 'deferred', 'skip')
+
 
 class MetaDataWriter:
 
     
     
-    def __init__(self, metafile, typ='datacite4.4'):
-        self.E = ElementMaker(nsmap={None: "http://datacite.org/schema/kernel-4"})
-        self.typ = typ
-        self.schema = self._mk_schema(self.typ)
-        self.attribute_defaults = self._mk_attribute_defaults(self.typ)
-        self.attribute_map = self._mk_attribute_map(self.typ)
-        self.meta = self._readmeta(metafile)
-        self.root = self._build_tree()
-        self._validate()
-        
+    def __init__(self, metafile, typ='datacite4.4', validate='eager',
+                 build=True, timings=None, root=None):
+        # a Timings object, if the stages are to be timed
+        self.timings = timings if timings is not None else NULL_TIMINGS
+        stage = self.timings.stage
+        with stage('readmeta'):
+            self.meta = self._readmeta(metafile)
+        # typ "auto": the version declared in the metadata (see detect_typ)
+        self.typ = detect_typ(self.meta) if typ == 'auto' else typ
+        with stage('schema'):
+            self.schema = self._mk_schema(self.typ)
+            self.attribute_defaults = self._mk_attribute_defaults(self.typ)
+            self.attribute_map = self._mk_attribute_map(self.typ)
+            self.names = self._mk_names(self.typ)
+        # With build=False no tree is built (and nothing is validated);
+        # use streamxml() to write the XML. A given <root> is used as the
+        # tree (see to_version()).
+        self.root = root
+        if build and root is None:
+            with stage('build_tree'):
+                self.root = self._build_tree()
+        self.validation_mode = self._validation_mode(validate if build
+                                                     else 'skip')
+        self._validation = None
+        if self.validation_mode == 'eager':
+            self.validate()
+
+    @staticmethod
+    def _validation_mode(validate):
+        if validate is True:
+            return 'eager'
+        if validate is False or validate is None:
+            return 'skip'
+        if validate not in VALIDATION_MODES:
+            raise ValueError('validate must be one of {}, got {!r}'
+                             .format(VALIDATION_MODES, validate))
+        return validate
+
+    def validate(self):
+        'Validates the tree (once) and returns the ValidationResult.'
+        if self._validation is None:
+            with self.timings.stage('validate'):
+                self._validation = self._validate()
+        return self._validation
+
+    @property
+    def validation(self):
+        'The ValidationResult, or None if validation is skipped.'
+        if self._validation is None and self.validation_mode == 'deferred':
+            self.validate()
+        return self._validation
+
+    @property
+    def valid(self):
+        'True / False, or None if validation is skipped.'
+        validation = self.validation
+        return validation.valid if validation is not None else None
+
+    def to_version(self, typ, validate='eager'):
+        '''Returns a MetaDataWriter for schema version <typ> ("auto": this
+        version). Its tree is this tree, transformed by the (cached) XSLT
+        from this version to <typ> if they differ.
+
+        '''
+        typ = self.typ if typ == 'auto' else typ_of(typ)
+        if self.root is None:
+            raise ValueError('No tree to transform (built with build=False)')
+        root = self.root
+        if typ != self.typ:
+            transform = get_transform(self.typ, typ)
+            with self.timings.stage('transform'):
+                root = transform(self.root).getroot()
+        return MetaDataWriter(self.meta, typ=typ, validate=validate,
+                              timings=self.timings, root=root)
 
     def _validate(self):
-        valid = self.schema.validate(ET.fromstring(ET.tostring(self.root)))
-        print("Validation passed: {}".format(valid))
-        if not valid:
-            print(self.schema.error_log)
+        if self.root is None:
+            raise ValueError('No tree to validate (built with build=False)')
+        return validate_tree(self.schema, self.root)
         
     def _readmeta(self, filename):
-        'Reads metadata from (json) file(stream)'
-        with open(filename, 'r') as f:
-            return json.load(f)
-
-    def writexml(self, filename=None):
-        'Writes the final XML'
-        if filename:
-            xml = ET.tostring(self.root, encoding='utf-8',
-                              xml_declaration=True)
-            with open(filename, 'w') as f:
-                f.write(xml.decode('utf-8'))
+        '''Reads metadata from (json) file(stream). An already decoded
+        node-object (a dict), or a Node, is taken as it is.
+
+        '''
+        if isinstance(filename, (dict, Node)):
+            return filename
+        with open(filename, 'rb') as f:
+            return codec.load(f)
+
+    def writexml(self, filename=None, pretty_print=None, compress=False,
+                 atomic=True):
+        '''Writes the final XML (UTF-8 encoded bytes) to <filename>, which
+        is a path, a binary file object, or None for stdout.
+
+        pretty_print: indent the XML. Default (None) is to pretty-print
+                      to stdout only.
+        compress:     gzip the output.
+        atomic:       write to a temporary file that replaces <filename>
+                      when complete (only if <filename> is a path).
+
+        '''
+        if pretty_print is None:
+            pretty_print = filename is None
+        xml = self.tostring(pretty_print=pretty_print)
+        with self.timings.stage('write'):
+            with open_output(filename, compress=compress,
+                             atomic=atomic) as f:
+                f.write(xml)
+
+    def tostring(self, pretty_print=False):
+        'Returns the XML as UTF-8 encoded bytes.'
+        with self.timings.stage('serialize'):
+            return ET.tostring(self.root, encoding='utf-8',
+                               xml_declaration=True,
+                               pretty_print=pretty_print)
+
+    def streamxml(self, filename=None, compress=False, atomic=True):
+        '''Writes the XML directly from the json-metadata, element by
+        element. This saves building the lxml tree and holding the
+        serialized document in memory; the json-metadata itself is still
+        read (decoded) completely. The output is not validated and not
+        pretty-printed. Arguments as for writexml().
+
+        '''
+        with self.timings.stage('stream'):
+            with open_output(filename, compress=compress,
+                             atomic=atomic) as f:
+                self._stream(f)
+
+    def _stream(self, f):
+        with ET.xmlfile(f, encoding='utf-8') as xf:
+            xf.write_declaration()
+            self.write_element(xf)
+
+    def write_element(self, xf):
+        '''Writes the record to the open lxml xmlfile <xf>: the tree, or,
+        if there is none (build=False), streamed from the json-metadata.
+
+        '''
+        if self.root is not None:
+            xf.write(self.root)
         else:
-            xml = ET.tostring(self.root, encoding='utf-8',
-                              xml_declaration=True,
-                              pretty_print=True)
-            print(xml.decode('utf-8'))
+            self._stream_tree(xf, self.meta, nsmap={None: DATACITE_NS})
+
+    def _node_parts(self, d):
+        '''Returns (tag, text, attributes, tail, children) of <d>, a Node
+        or a node-object {tag: v}.
+
+        '''
+        attribute = self.names.attribute
+        if isinstance(d, Node):
+            k = d.tag
+            att = {attribute(a): val for a, val in d.att or ()}
+            text, tail = d.val or None, d.tail or None
+            children = d.children or []
+        else:
+            assert len(d) == 1
+            k, v = next(iter(d.items()))
+            if isinstance(v, str):
+                text, att, tail, children = v, {}, None, []
+            elif v is None:
+                # an empty element, as written by Node.to_json before
+                text, att, tail, children = None, {}, None, []
+            elif isinstance(v, list):
+                text, att, tail, children = None, {}, None, v
+            else:
+                att = {attribute(a): val
+                       for a, val in (v.get('att') or {}).items()}
+                text = v.get('val') or None
+                tail = v.get('tail') or None
+                children = v.get('children', [])
+        default_att = self.attribute_defaults.get(k)
+        if default_att:
+            att.update(default_att)
+        return k, text, att, tail, children
+
+    def _stream_tree(self, xf, d, nsmap=None):
+        # Iterative depth-first traversal, as in _build_tree; the stack
+        # holds the open elements (xmlfile contexts) together with an
+        # iterator over their remaining children and their tail.
+        # Tags are written as they appear in the json (i.e. unqualified,
+        # falling into the default namespace declared at the root).
+        stack = []
+        todo = iter([d])
+        try:
+            while True:
+                child = next(todo, None)
+                if child is None:
+                    if not stack:
+                        break
+                    element, todo, tail = stack.pop()
+                    element.__exit__(None, None, None)
+                    if tail:
+                        xf.write(tail)
+                    continue
+                k, text, att, tail, children = self._node_parts(child)
+                if not children:
+                    # leaves are serialized by lxml itself
+                    el = ET.Element(k, att)
+                    el.text = text
+                    el.tail = tail
+                    xf.write(el)
+                    continue
+                # xmlfile doesn't manage prefixes of attributes, so they
+                # have to be declared explicitly - except xml:, which is
+                # always bound and is given by its prefix instead.
+                nsmap = dict(nsmap or {})
+                attrib = {}
+                for a, v in att.items():
+                    qname = ET.QName(a)
+                    if qname.namespace == XML_NS:
+                        a = 'xml:' + qname.localname
+                    elif qname.namespace:
+                        nsmap.setdefault(PREFIXES.get(
+                            qname.namespace, 'ns{}'.format(len(nsmap))),
+                            qname.namespace)
+                    attrib[a] = v
+                element = xf.element(k, attrib, nsmap=nsmap or None)
+                element.__enter__()
+                # only the root declares the namespaces passed in
+                nsmap = None
+                stack.append((element, todo, tail))
+                if text:
+                    xf.write(text)
+                todo = iter(children)
+        except BaseException:
+            exc = sys.exc_info()
+            for element, _, _ in reversed(stack):
+                element.__exit__(*exc)
+            raise
             
     def _mk_attribute_map(self, typ):
-        if typ == 'datacite4.4':
+        if typ in VERSIONS:
             return {
                 'lang': '{http://www.w3.org/XML/1998/namespace}lang',
             }
@@ -93,79 +556,219 @@ class MetaDataWriter:
             return {}
 
     def _mk_attribute_defaults(self, typ):
-        if typ == 'datacite4.4':
+        if typ in VERSIONS:
             return {
                 'resource': {
                     '{http://www.w3.org/2001/XMLSchema-instance}schemaLocation':
                     'http://datacite.org/schema/kernel-4 '
-                    'http://schema.datacite.org/meta/kernel-4.4/metadata.xsd'
+                    + VERSIONS[typ]['location']
                 }
             }
         else:
             return {}
 
     def _mk_schema(self, typ):
-        if typ == 'datacite4.4':
-            schemadef = pkg_resources.resource_stream(__name__, 'schema/datacite/metadata_schema_4.4.xsd')
-            return ET.XMLSchema(
-                ET.parse(schemadef)
-            )
+        return get_schema(typ)
     
+    def _mk_names(self, typ):
+        names = _name_caches.get(typ)
+        if names is None:
+            names = _name_caches.setdefault(
+                typ, NameCache(DATACITE_NS, self._mk_attribute_map(typ)))
+        return names
+
     def _build_tree(self, d=None):
         "Traverses the json-metadata and builds the corresponding lxml-tree"
+        # Iterative depth-first traversal; the stack holds the open
+        # elements together with an iterator over their remaining children.
+        # Tags are namespace-qualified, so the tree can be validated as
+        # it is, without serializing and re-parsing it.
         d = d or self.meta
-        assert len(d) == 1
-        k = list(d.keys())[0]
-        v = list(d.values())[0]
-        default_att = self.attribute_defaults.get(k)
-        if isinstance(v, str):
-            # simple element
-            el = self.E(k)
-            el.text = v
-            if default_att:
-                el.attrib.update(default_att)
-            return el
-        if isinstance(v, list):
-            # element containing sequence of child elements / no attributes
-            el = self.E(k)
-            for child in v:
-                el.append(self._build_tree(d=child))
-            if default_att:
-                el.attrib.update(default_att)
-            return el
-        if isinstance(v, dict):
-            # element with attribute(s)
-            el = self.E(k)
-            att = v.get('att') 
-            if att:
-                att = {self.attribute_map.get(k) or k: v for k, v in att.items()}
-                el.attrib.update(att)
-            if default_att:
-                el.attrib.update(default_att)
-            if v.get('val'):
-                el.text =  v.get('val')
-            if v.get('tail'):
-                el.tail = v.get('tail')
-            children = v.get('children', [])
-            for child in children:
-                el.append(self._build_tree(d=child))
-            return el
+        root, children = self._mk_element(d, None)
+        stack = [(root, iter(children))]
+        while stack:
+            parent, todo = stack[-1]
+            child = next(todo, None)
+            if child is None:
+                stack.pop()
+                continue
+            el, children = self._mk_element(child, parent)
+            if children:
+                stack.append((el, iter(children)))
+        return root
+
+    def _mk_element(self, d, parent):
+        """Creates the element for node-object (or Node) <d> (as child of
+        <parent>, or as root if <parent> is None). Returns the element
+        and the node-objects of its children.
+
+        """
+        k, text, att, tail, children = self._node_parts(d)
+        tag = self.names.tag(k)
+        if parent is None:
+            el = ET.Element(tag, att, nsmap={None: DATACITE_NS})
+        else:
+            el = ET.SubElement(parent, tag, att)
+        if text is not None:
+            el.text = text
+        if tail:
+            el.tail = tail
+        return el, children
+
+
+def stream_writer(metafile, typ='auto', timings=None):
+    '''Returns a MetaDataWriter for streamxml() (build=False) of
+    <metafile>. Streaming writes the metadata as it is, so <typ> must be
+    "auto" or the version the metadata declares (ValueError otherwise).
+
+    '''
+    mdw = MetaDataWriter(metafile, typ='auto', build=False, timings=timings)
+    typ = typ_of(typ)
+    if typ not in ('auto', mdw.typ):
+        raise ValueError('Cannot stream {} metadata as {}; the conversion'
+                         ' needs the tree (drop --stream)'
+                         .format(mdw.typ, typ))
+    return mdw
+
 
 def main():
     doc = """mkdcxml
-    Usage: mkdcxml [-o <outfile>] <metadatafile>
+    Usage: mkdcxml batch [-j <workers>] [-d <outdir>] [--summary=<summaryfile>]
+                         [--no-validate] [--schema=<version>] [--timings]
+                         [--tracemalloc] [--profile=<seconds>] <input>...
+           mkdcxml jsonl [-d <outdir>] [--summary=<summaryfile>]
+                         [--no-validate | --stream] [--schema=<version>]
+                         [--timings]
+                         [--tracemalloc] [--profile=<seconds>]
+                         [--collection=<xmlfile> [--oai] [--gzip]]
+                         [<jsonlfile>]
+           mkdcxml validate [-j <workers>] [--processes] [--schema=<version>]
+                            [--summary=<summaryfile>] <input>...
+           mkdcxml tojson [-o <outfile>] [--gzip] [<xmlfile>]
+           mkdcxml serve [-j <workers>] [--host=<host>] [--port=<port>]
+                         [--socket=<path>] [--verbose]
+           mkdcxml [-o <outfile>] [--no-validate | --stream]
+                   [--pretty | --compact] [--gzip] [--schema=<version>]
+                   [--timings] [--tracemalloc] <metadatafile>
     
     Options:
       -o, --outfile <outfile>    output file
+      --no-validate              build the XML without validating it
+      --stream                   write the XML while reading the metadata,
+                                 without building (and validating) the tree;
+                                 only to the version the metadata declares
+      --pretty                   pretty-print the XML (default for stdout)
+      --compact                  don't pretty-print (default for <outfile>)
+      --gzip                     gzip-compress the output
+      --schema=<version>         DataCite schema version of the XML: 4.1,
+                                 4.4, or auto (default) - the version
+                                 the metadata declares in the
+                                 xsi:schemaLocation of "resource", else
+                                 4.4. Other versions are transformed
+                                 from that one. For batch a comma
+                                 separated list; with more than one
+                                 version, each goes to <name>.<typ>.xml.
+                                 For serve see mkdcxml.service
+      --collection=<xmlfile>     write all records to <xmlfile>, in a
+                                 <collection> element (records that
+                                 fail validation are left out)
+      --oai                      ... in an OAI-PMH ListRecords response
+                                 instead
+      -j, --jobs <workers>       number of worker processes, or threads
+                                 for validate (default: number of CPUs)
+      --processes                validate with processes instead of threads
+      -d, --outdir <outdir>      directory for the XML files
+                                 (default: next to each input file)
+      --summary=<summaryfile>    write a json summary (pass/fail counts,
+                                 timings, the errors of each file) to
+                                 <summaryfile>
+      --host=<host>              address the service listens on
+                                 (default: 127.0.0.1)
+      --port=<port>              port the service listens on
+                                 (default: 8787)
+      --socket=<path>            listen on the Unix socket <path> instead
+      --verbose                  log every request
+      --timings                  report the time taken by each stage
+                                 (see mkdcxml.timing); batch and jsonl
+                                 report percentiles over all documents
+      --tracemalloc              trace allocations: report the bytes
+                                 allocated by each stage, and profile
+                                 with tracemalloc snapshots
+      --profile=<seconds>        profile each document and dump the
+                                 profile of those that take longer than
+                                 <seconds> next to the XML file
+                                 (<xmlfile>.prof, or .snapshot with
+                                 --tracemalloc)
 
     Arguments:
       <metadatafile>    The metadata in json format.
+      <input>           json metadata files, or directories containing them
+                        (for validate: XML files, *.xml or *.xml.gz).
+      <jsonlfile>       json lines file, one node-object per line
+                        (default: stdin). Each record is written to
+                        <outdir>/<identifier>.xml (or to the collection).
+      <xmlfile>         DataCite XML with one or more <resource> records
+                        (e.g. a collection or an OAI-PMH response),
+                        optionally gzip-compressed (default: stdin).
+
+    "mkdcxml validate" validates existing DataCite XML files against the
+    schema they declare (or <version>; see mkdcxml.validate).
+
+    "mkdcxml tojson" converts DataCite XML back to node-object json, one
+    record per line (the input of "mkdcxml jsonl"; see mkdcxml.xml2json).
+
+    "mkdcxml serve" runs the conversion service (see mkdcxml.service).
     
     """
     args = docopt(doc, argv=sys.argv[1:], help=True)
-    mdw = MetaDataWriter(args['<metadatafile>'])
-    outfile = args['--outfile']
-    mdw.writexml(outfile)
+    # unknown versions are reported here, not as a traceback later
+    try:
+        if args['batch']:
+            from mkdcxml.batch import typ_list
+            typ_list(args['--schema'])
+        else:
+            typ_of(args['--schema'] or 'auto')
+    except ValueError as e:
+        sys.exit(e)
+    if args['batch']:
+        from mkdcxml.batch import main as batch_main
+        sys.exit(batch_main(args))
+    if args['jsonl']:
+        from mkdcxml.jsonl import main as jsonl_main
+        sys.exit(jsonl_main(args))
+    if args['validate']:
+        from mkdcxml.validate import main as validate_main
+        sys.exit(validate_main(args))
+    if args['tojson']:
+        from mkdcxml.xml2json import main as tojson_main
+        sys.exit(tojson_main(args))
+    if args['serve']:
+        from mkdcxml.service import main as serve_main
+        sys.exit(serve_main(args))
+    if args['--tracemalloc']:
+        import tracemalloc
+        tracemalloc.start()
+    timings = Timings() if args['--timings'] else None
+    typ = typ_of(args['--schema'] or 'auto')
+    if args['--stream']:
+        try:
+            mdw = stream_writer(args['<metadatafile>'], typ, timings=timings)
+        except ValueError as e:
+            sys.exit(e)
+        mdw.streamxml(args['--outfile'], compress=args['--gzip'])
+    else:
+        mdw = MetaDataWriter(args['<metadatafile>'], typ='auto',
+                             validate='skip', timings=timings).to_version(
+            typ, validate='skip' if args['--no-validate'] else 'eager')
+        if mdw.validation is not None:
+            # stderr: the XML may go to stdout
+            print(mdw.validation, file=sys.stderr)
+        pretty = (True if args['--pretty'] else False if args['--compact']
+                  else None)
+        mdw.writexml(args['--outfile'], pretty_print=pretty,
+                     compress=args['--gzip'])
+    if timings is not None:
+        timings.report()
 
 if __name__ == "__main__":
     main()
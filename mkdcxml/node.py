@@ -0,0 +1,119 @@
+# _*_ coding: utf-8 _*_
+
+''' Compact in-memory node-objects.
+
+The extractors (see mkdcxml.mapping) build their output from Node
+objects rather than the nested one-key dicts and lists of the json
+format, and MetaDataWriter consumes them directly. A Node has slots
+instead of a __dict__:
+
+  tag        the tag name (interned)
+  val        the text, or None
+  att        the attributes, a tuple of (name, value) pairs, or None.
+             Tuples are interned as well (see intern_att), so that the
+             attributes that recur in every record (lang="en",
+             dateType="Submitted", ...) are stored once per process.
+  children   a list of Nodes, or None
+  tail       the tail text, or None
+
+Nodes convert to and from the json node-objects. to_json() gives the
+form the extractors wrote before Nodes existed:
+
+  val only                         {"tag": val}
+  children only                    {"tag": [children]}
+  anything with att or tail        {"tag": {"val", "att", "children",
+                                            "tail"}} (those not None)
+  nothing (an empty element)       {"tag": {}}
+
+so the json files, and the hashes of the harvest state, do not change.
+The codec (mkdcxml.codec) serializes Nodes as they are.
+
+'''
+
+import sys
+
+# interned attribute tuples, see intern_att(). The attribute values of
+# DataCite (types, schemes, languages) are few, so this stays small.
+_atts = {}
+
+
+def intern_att(att):
+    '''Returns the attributes <att> (a dict or (name, value) pairs) as
+    interned tuple of pairs with interned names, or None if empty.
+
+    '''
+    if not att:
+        return None
+    att = tuple(att.items() if isinstance(att, dict) else att)
+    try:
+        return _atts[att]
+    except KeyError:
+        interned = tuple((sys.intern(a), v) for a, v in att)
+        _atts[att] = interned
+        return interned
+    except TypeError:
+        # unhashable values
+        return tuple((sys.intern(a), v) for a, v in att)
+
+
+class Node:
+
+    __slots__ = ('tag', 'val', 'att', 'children', 'tail')
+
+    def __init__(self, tag, val=None, att=None, children=None, tail=None):
+        self.tag = sys.intern(tag)
+        self.val = val
+        self.att = intern_att(att) if att else None
+        self.children = children
+        self.tail = tail
+
+    def __repr__(self):
+        return 'Node({!r})'.format(self.to_json())
+
+    def __eq__(self, other):
+        if not isinstance(other, Node):
+            return NotImplemented
+        return all(getattr(self, s) == getattr(other, s)
+                   for s in self.__slots__)
+
+    __hash__ = None
+
+    def find(self, tag):
+        'Returns the first child with <tag>, or None.'
+        for child in self.children or ():
+            if child.tag == tag:
+                return child
+        return None
+
+    def to_json(self):
+        'Returns the json node-object (a one-key dict).'
+        if self.att is None and self.tail is None:
+            if self.children is None and self.val is not None:
+                return {self.tag: self.val}
+            if self.children is not None and self.val is None:
+                return {self.tag: [c.to_json() for c in self.children]}
+        v = {}
+        if self.val is not None:
+            v['val'] = self.val
+        if self.att is not None:
+            v['att'] = dict(self.att)
+        if self.children is not None:
+            v['children'] = [c.to_json() for c in self.children]
+        if self.tail is not None:
+            v['tail'] = self.tail
+        return {self.tag: v}
+
+    @classmethod
+    def from_json(cls, d):
+        'Returns the Node for the json node-object <d>.'
+        assert len(d) == 1
+        k, v = next(iter(d.items()))
+        if isinstance(v, list):
+            return cls(k, children=[cls.from_json(c) for c in v])
+        if isinstance(v, dict):
+            children = v.get('children')
+            return cls(k, val=v.get('val'), att=v.get('att'),
+                       children=(None if children is None else
+                                 [cls.from_json(c) for c in children]),
+                       tail=v.get('tail'))
+        return cls(k, val=v)
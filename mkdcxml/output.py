@@ -0,0 +1,107 @@
+# _*_ coding: utf-8 _*_
+
+''' Output sinks for the XML.
+
+open_output() returns a binary file object to write to. The target is
+either a filename, an open binary file object, or None (stdout).
+Optionally the output is gzip-compressed.
+
+Regular files given by name are written atomically: the data goes to
+a temporary file in the same directory, which is renamed to the final
+name only after everything was written and synced to disk. A crash
+leaves the previous version of the file (or no file) in place, never a
+truncated one. The new file keeps the mode of the file it replaces. Other targets (devices
+such as /dev/null, symlinks, FIFOs, ...) are written in place.
+
+'''
+
+import os
+import sys
+import gzip
+import stat
+import binascii
+from contextlib import contextmanager
+
+
+def _replaceable(target):
+    '''True if <target> may be replaced by renaming a new file over it:
+    it does not exist, or it is a regular file (not a symlink, device or
+    FIFO) with no other hard links, owned by us.
+
+    '''
+    try:
+        st = os.lstat(target)
+    except FileNotFoundError:
+        return True
+    return (stat.S_ISREG(st.st_mode) and st.st_nlink == 1
+            and st.st_uid == os.geteuid())
+
+
+def _mktemp(target):
+    '''Creates a new file next to <target>. Returns (fd, name). Its mode
+    is that of <target> if it exists, else 0o666 less the umask (like a
+    file created with open()).
+
+    '''
+    dirname, basename = os.path.split(os.path.abspath(target))
+    try:
+        mode = stat.S_IMODE(os.stat(target).st_mode)
+    except FileNotFoundError:
+        mode = None
+    while True:
+        tmpname = os.path.join(dirname, '.{}.{}.tmp'.format(
+            basename, binascii.hexlify(os.urandom(4)).decode()))
+        try:
+            fd = os.open(tmpname, os.O_WRONLY | os.O_CREAT | os.O_EXCL,
+                         0o666)
+        except FileExistsError:
+            continue
+        if mode is not None:
+            os.fchmod(fd, mode)
+        return fd, tmpname
+
+
+@contextmanager
+def open_output(target=None, compress=False, atomic=True):
+    '''Context manager that yields a binary file object writing to
+    <target> (filename, binary file object or None for stdout).
+
+    With <atomic>, a path is only written atomically if it is a regular
+    file (or does not exist yet); anything else - /dev/null, a symlink,
+    a FIFO, a file with hard links or of another owner - is written in
+    place, as with open().
+
+    '''
+    if target is None or hasattr(target, 'write'):
+        raw = sys.stdout.buffer if target is None else target
+        out = gzip.GzipFile(fileobj=raw, mode='wb') if compress else raw
+        yield out
+        if compress:
+            out.close()
+        raw.flush()
+        return
+
+    if atomic and _replaceable(target):
+        fd, tmpname = _mktemp(target)
+        raw = os.fdopen(fd, 'wb')
+    else:
+        tmpname = None
+        raw = open(target, 'wb')
+    try:
+        out = gzip.GzipFile(fileobj=raw, mode='wb') if compress else raw
+        yield out
+        if compress:
+            out.close()
+        if tmpname:
+            # on disk before the rename, so that a crash (or power loss)
+            # can't leave an empty or truncated file under <target>
+            raw.flush()
+            os.fsync(raw.fileno())
+        raw.close()
+        if tmpname:
+            os.replace(tmpname, target)
+    except BaseException:
+        raw.close()
+        if tmpname:
+            os.unlink(tmpname)
+        raise
@@ -0,0 +1,240 @@
+# _*_ coding: utf-8 _*_
+
+'''ckan2xml
+
+Usage:
+  ckan2xml [-s <hosturl>] [--project] [--affils=<affilmap>]
+           [--orcids=<orcids>] [--related_identifiers=<relids>]
+           [-d <outdir>] [--json] [--pretty] [--cache=<cachefile>]
+           [--offline] [--authors=<authorsdb>] [--unresolved=<report>]
+           [--timings] [--async] [--schema=<version>]
+           [--resource-type=<type>]
+           [--resource-type-general=<general>]
+           [--resource-version=<version>] (<doi> <package_name>)...
+  ckan2xml -h
+
+Options:
+  --server, -s <hosturl>           The url of the CKAN instance.
+                                   [default: https://data.eawag.ch]
+  --project                        The packages are CKAN projects
+                                   (see ckanextract_project).
+  --help, -h                       Show this screen
+  --affils=<affilmap>              Read affiliations of authors from <affilamp>.
+                                   Else, interactve input.
+  --orcids=<orcids>                Reads ORCIDs from file, else interactive input.
+  --related_identifiers=<relids>   Reads related identifiers from file.
+  --outdir, -d <outdir>            Directory for the XML files. [default: .]
+  --json                           Also write the intermediate json.
+  --pretty                         Pretty-print the XML.
+  --cache=<cachefile>              Cache CKAN metadata in <cachefile>
+                                   (see mkdcxml.cache). The cached copy
+                                   is used only if its metadata_modified
+                                   is still current.
+  --offline                        Use only cached CKAN metadata (from
+                                   <cachefile> or the default cache),
+                                   regardless of its age.
+  --authors=<authorsdb>            Look up ORCIDs and affiliations in the
+                                   author store <authorsdb> (see
+                                   mkdcxml.authors), without asking.
+  --unresolved=<report>            Write authors not found in <authorsdb>
+                                   to <report> (json). [default: -]
+  --timings                        Report the time taken by each stage
+                                   (fetch, sections, build, validation,
+                                   serialization) of each package (see
+                                   mkdcxml.timing).
+  --schema=<version>               DataCite schema version of the XML:
+                                   4.1, 4.4, or auto (the version the
+                                   metadata declares, else 4.4).
+                                   [default: auto]
+  --async                          Fetch all packages first, concurrently,
+                                   with the asyncio client (see
+                                   aioclient; requires aiohttp).
+  --resource-type=<type>           ResourceType of the packages.
+                                   Else, the default of the mapping.
+  --resource-type-general=<general>
+                                   ResourceTypeGeneral of the packages.
+                                   Else, the default of the mapping.
+  --resource-version=<version>     Version of the packages. Else, the
+                                   default of the mapping.
+
+Arguments:
+  <doi>          DOI in the form "10.25678/000011"
+  <package_name> The CKAN package name
+
+  For <affilmap>, <orcids> and <relids> see ckanextract.
+
+This module extracts the metadata of CKAN packages (see ckanextract)
+and converts it to DataCite XML (see mkdcxml) in one process. The
+node-object is handed to the MetaDataWriter in memory, no intermediate
+json file is written (unless --json is given).
+
+Each XML is written to <outdir>/<doi>.xml ("/" replaced by "_").
+
+Nothing is asked (ResourceType, version, ORCIDs and affiliations of
+authors not in a map or <authorsdb>) if stdin is not a terminal, or if
+a --resource-type, --resource-type-general or --resource-version option
+is given. The options, or else the defaults of the mapping, are used;
+such authors get neither ORCID nor affiliation. A package that fails
+is reported and counted, the others are converted anyway.
+
+'''
+
+import os
+import sys
+from collections import namedtuple
+from docopt import docopt
+
+from mkdcxml import codec
+from mkdcxml.cache import MetaCache, DEFAULT_PATH
+from mkdcxml.authors import AuthorStore, report_unresolved
+from mkdcxml.mkdcxml import MetaDataWriter, typ_of
+from mkdcxml.jsonl import outname
+from mkdcxml.output import open_output
+from mkdcxml.timing import Timings
+
+Conversion = namedtuple('Conversion',
+                        ['package', 'doi', 'meta', 'xml', 'validation'])
+
+
+def extractor_class(project=False):
+    if project:
+        from mkdcxml.ckanextract_project import CKANExtract
+    else:
+        from mkdcxml.ckanextract import CKANExtract
+    return CKANExtract
+
+
+def extract(pkgname, doi, server, affils=None, orcids=None, relids=None,
+            project=False, ckanmeta=None, cache=None, authors=None,
+            timings=None, answers=None):
+    '''Returns the node-object of CKAN package <pkgname>. <ckanmeta> is
+    the package_show result, if already fetched. <cache> is a MetaCache,
+    <authors> an AuthorStore, <timings> a Timings object. With <answers>
+    (a dict, see mapping.BaseExtract) nothing is asked.
+
+    '''
+    CKANExtract = extractor_class(project)
+    if project:
+        ex = CKANExtract(pkgname, doi, None, server, relids,
+                         ckanmeta=ckanmeta, cache=cache, authors=authors,
+                         timings=timings, answers=answers)
+    else:
+        ex = CKANExtract(pkgname, doi, None, server, affils, orcids, relids,
+                         ckanmeta=ckanmeta, cache=cache, authors=authors,
+                         timings=timings, answers=answers)
+    return ex.extract()
+
+
+def convert(meta, typ='auto', validate='eager', pretty_print=False,
+            timings=None):
+    '''Converts the node-object <meta> to XML of schema version <typ>
+    ("auto": the version <meta> declares).
+    Returns (XML bytes, ValidationResult or None).
+
+    '''
+    mdw = MetaDataWriter(meta, typ='auto', validate='skip',
+                         timings=timings).to_version(typ, validate=validate)
+    return mdw.tostring(pretty_print=pretty_print), mdw.validation
+
+
+def ckan_to_xml(pkgname, doi, server, affils=None, orcids=None, relids=None,
+                project=False, validate='eager', pretty_print=False,
+                ckanmeta=None, cache=None, authors=None, timings=None,
+                answers=None, typ='auto'):
+    'Extracts and converts one CKAN package. Returns a Conversion.'
+    meta = extract(pkgname, doi, server, affils=affils, orcids=orcids,
+                   relids=relids, project=project, ckanmeta=ckanmeta,
+                   cache=cache, authors=authors, timings=timings,
+                   answers=answers)
+    xml, validation = convert(meta, typ=typ, validate=validate,
+                              pretty_print=pretty_print, timings=timings)
+    return Conversion(pkgname, doi, meta, xml, validation)
+
+
+def prefetch(server, names, project=False, cache=None):
+    '''Fetches the packages <names> from <server> concurrently with the
+    asyncio client, and caches them in <cache> (a MetaCache). Returns a
+    dict that maps the names to package_show results, or exceptions.
+
+    '''
+    from mkdcxml.aioclient import fetch_packages
+    names = list(dict.fromkeys(names))
+    jobs = {server: (extractor_class(project).apikey(), names)}
+    fetched = dict(fetch_packages(jobs)[server])
+    if cache is not None:
+        for name, meta in fetched.items():
+            if not isinstance(meta, Exception):
+                cache.put(server, name, meta)
+    return fetched
+
+
+def answers_of(args):
+    '''The answers to the prompts of the mapping given in the docopt
+    <args> (--resource-type, --resource-type-general, --resource-version).
+
+    '''
+    given = {'resourceType': args['--resource-type'],
+             'resourceTypeGeneral': args['--resource-type-general'],
+             'version': args['--resource-version']}
+    return {k: v for k, v in given.items() if v}
+
+
+def main():
+    args = docopt(__doc__, argv=sys.argv[1:])
+    outdir = args['--outdir']
+    os.makedirs(outdir, exist_ok=True)
+    cache = (MetaCache(args['--cache'] or DEFAULT_PATH,
+                       offline=args['--offline'])
+             if args['--cache'] or args['--offline'] else None)
+    authors = AuthorStore(args['--authors']) if args['--authors'] else None
+    try:
+        typ = typ_of(args['--schema'])
+    except ValueError as e:
+        sys.exit(e)
+    answers = answers_of(args)
+    if not answers and sys.stdin.isatty():
+        answers = None
+    failed = 0
+    prefetched = {}
+    if args['--async'] and not args['--offline']:
+        prefetched = prefetch(args['--server'], args['<package_name>'],
+                              project=args['--project'], cache=cache)
+    for n, (doi, pkgname) in enumerate(zip(args['<doi>'],
+                                           args['<package_name>']), 1):
+        timings = Timings() if args['--timings'] else None
+        meta = prefetched.get(pkgname)
+        if isinstance(meta, Exception):
+            print('{}: fetch failed: {}: {}'
+                  .format(pkgname, type(meta).__name__, meta))
+            failed += 1
+            continue
+        try:
+            conv = ckan_to_xml(pkgname, doi, args['--server'],
+                               affils=args['--affils'],
+                               orcids=args['--orcids'],
+                               relids=args['--related_identifiers'],
+                               project=args['--project'],
+                               pretty_print=args['--pretty'], cache=cache,
+                               ckanmeta=meta, authors=authors,
+                               timings=timings, answers=answers, typ=typ)
+        except Exception as e:
+            print('{}: error: {}: {}'.format(pkgname, type(e).__name__, e))
+            failed += 1
+            continue
+        xmlfile = outname(conv.meta, n, outdir)
+        with open_output(xmlfile) as f:
+            f.write(conv.xml)
+        if args['--json']:
+            with open_output(os.path.splitext(xmlfile)[0] + '.json') as f:
+                codec.dump(conv.meta, f)
+        print('{}: {}'.format(pkgname, conv.validation))
+        if timings is not None:
+            timings.report()
+        failed += not conv.validation.valid
+    if authors is not None:
+        report_unresolved(authors, args['--unresolved'])
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
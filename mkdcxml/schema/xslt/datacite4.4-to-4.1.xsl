@@ -0,0 +1,39 @@
+<?xml version="1.0" encoding="UTF-8"?>
+<!-- DataCite 4.4 to 4.1.
+     Drops what 4.1 does not know (relatedItems, the attributes of
+     affiliation and rights added in 4.2 - 4.4, xml:lang of names and
+     publisher, classificationCode) and the dates and related identifiers
+     whose dateType / relationType 4.1 does not know. resourceTypeGeneral
+     values added in 4.4 are mapped to "Text" ("Software" for
+     ComputationalNotebook). -->
+<xsl:stylesheet version="1.0"
+                xmlns:xsl="http://www.w3.org/1999/XSL/Transform"
+                xmlns:dc="http://datacite.org/schema/kernel-4"
+                xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">
+
+  <xsl:template match="@*|node()">
+    <xsl:copy>
+      <xsl:apply-templates select="@*|node()"/>
+    </xsl:copy>
+  </xsl:template>
+
+  <xsl:template match="/dc:resource/@xsi:schemaLocation">
+    <xsl:attribute name="xsi:schemaLocation">http://datacite.org/schema/kernel-4 http://schema.datacite.org/meta/kernel-4.1/metadata.xsd</xsl:attribute>
+  </xsl:template>
+
+  <xsl:template match="dc:relatedItems"/>
+  <xsl:template match="dc:affiliation/@*"/>
+  <xsl:template match="dc:creatorName/@xml:lang|dc:contributorName/@xml:lang|dc:publisher/@xml:lang"/>
+  <xsl:template match="dc:rights/@rightsIdentifier|dc:rights/@rightsIdentifierScheme|dc:rights/@schemeURI"/>
+  <xsl:template match="dc:subject/@classificationCode"/>
+  <xsl:template match="dc:date[@dateType='Withdrawn']"/>
+  <xsl:template match="dc:relatedIdentifier[@relationType='IsPublishedIn' or @relationType='Obsoletes' or @relationType='IsObsoletedBy']"/>
+
+  <xsl:template match="@resourceTypeGeneral[.='Book' or .='BookChapter' or .='ConferencePaper' or .='ConferenceProceeding' or .='Dissertation' or .='Journal' or .='JournalArticle' or .='OutputManagementPlan' or .='PeerReview' or .='Preprint' or .='Report' or .='Standard']">
+    <xsl:attribute name="resourceTypeGeneral">Text</xsl:attribute>
+  </xsl:template>
+  <xsl:template match="@resourceTypeGeneral[.='ComputationalNotebook']">
+    <xsl:attribute name="resourceTypeGeneral">Software</xsl:attribute>
+  </xsl:template>
+
+</xsl:stylesheet>
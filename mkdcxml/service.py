@@ -0,0 +1,275 @@
+# _*_ coding: utf-8 _*_
+
+''' Conversion service ("mkdcxml serve").
+
+A long-running HTTP server, on a TCP port of the local host or on a
+Unix socket, that converts node-object json to DataCite XML. Requests
+are handed to a pool of worker processes; each worker compiles the
+schemas and sets up its name caches once at start-up (see
+mkdcxml.prewarm), so a request only pays for the conversion itself.
+
+Endpoints:
+
+  POST /convert   The body is a node-object (json). Query parameters:
+                    validate=eager|skip   (default: eager)
+                    schema=4.1|4.4|auto   the DataCite schema version
+                                          (default: auto, the version
+                                          the node-object declares)
+                    pretty=1              pretty-print the XML
+                    format=json|xml       (default: json)
+                  With format=json the response is
+                    {"xml": "...", "valid": true|false|null,
+                     "errors": [...], "timings": {...}}
+                  With format=xml the body is the XML, and the header
+                  X-Validation is "passed", "failed" or "skipped" (the
+                  errors are only available with format=json).
+                  Bad input is answered with 400 and {"error": "..."}.
+  GET /metrics    Request counts and latency percentiles (seconds) of
+                  the last requests, overall and per stage (see
+                  mkdcxml.timing).
+  GET /health     {"status": "ok"}
+
+'''
+
+import os
+import sys
+import json
+import time
+import signal
+import threading
+import socketserver
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+from mkdcxml import codec
+from mkdcxml.mkdcxml import (MetaDataWriter, prewarm, typ_of,
+                             VALIDATION_MODES)
+from mkdcxml.timing import Timings, percentile, percentiles, PERCENTILES
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8787
+MAX_BODY = 64 * 2**20
+WINDOW = 1000
+
+
+def init_worker():
+    'Initializer of the worker processes: warms schemas and name caches.'
+    prewarm()
+    MetaDataWriter({'resource': []}, validate='skip')
+
+
+def convert(body, validate='eager', pretty_print=False, typ='auto'):
+    '''Converts the node-object json <body> (bytes) to schema version
+    <typ> ("auto": the declared one). Returns (XML bytes, validation as
+    dict or None, timings as dict). Runs in a worker.
+
+    '''
+    timings = Timings()
+    with timings.stage('readmeta'):
+        meta = codec.loads(body)
+    mdw = MetaDataWriter(meta, typ='auto', validate='skip',
+                         timings=timings).to_version(typ, validate=validate)
+    xml = mdw.tostring(pretty_print=pretty_print)
+    validation = mdw.validation
+    return (xml, validation.as_dict() if validation is not None else None,
+            timings.as_dict())
+
+
+class Metrics:
+    'Request counts and the latencies of the last <window> requests.'
+
+    def __init__(self, window=WINDOW):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.invalid = 0
+        self.in_flight = 0
+        self.latencies = deque(maxlen=window)
+        self.timings = deque(maxlen=window)
+
+    def begin(self):
+        with self.lock:
+            self.in_flight += 1
+
+    def end(self, seconds, status, timings=None):
+        '''Records a request that took <seconds>. <status> is "passed",
+        "failed", "skipped" or "error".
+
+        '''
+        with self.lock:
+            self.in_flight -= 1
+            self.requests += 1
+            self.errors += status == 'error'
+            self.invalid += status == 'failed'
+            self.latencies.append(seconds)
+            if timings is not None:
+                self.timings.append(timings)
+
+    def as_dict(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            timings = list(self.timings)
+            d = {'uptime': time.time() - self.started,
+                 'requests': self.requests, 'errors': self.errors,
+                 'invalid': self.invalid, 'in_flight': self.in_flight}
+        d['latency'] = {'n': len(latencies)}
+        for p in PERCENTILES:
+            d['latency']['p{}'.format(p)] = percentile(latencies, p)
+        d['latency']['max'] = latencies[-1] if latencies else None
+        d['stages'] = percentiles(timings)
+        return d
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    server_version = 'mkdcxml'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            sys.stderr.write('{} {}\n'.format(self.log_date_time_string(),
+                                              format % args))
+
+    def send_body(self, status, body, content_type='application/json',
+                  headers=None):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == '/health':
+            self.send_body(200, {'status': 'ok'})
+        elif path == '/metrics':
+            self.send_body(200, self.server.metrics.as_dict())
+        else:
+            self.send_body(404, {'error': 'Not found: {}'.format(path)})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path != '/convert':
+            self.send_body(404, {'error': 'Not found: {}'.format(url.path)})
+            return
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        validate = query.get('validate', 'eager')
+        fmt = query.get('format', 'json')
+        try:
+            typ = typ_of(query.get('schema', 'auto'))
+        except ValueError:
+            typ = None
+        if (validate not in VALIDATION_MODES or fmt not in ('json', 'xml')
+                or typ is None):
+            self.send_body(400, {'error': 'Bad query: {}'.format(url.query)})
+            return
+        try:
+            length = int(self.headers['Content-Length'])
+        except (TypeError, ValueError):
+            self.send_body(411, {'error': 'Content-Length required'})
+            return
+        if length > MAX_BODY:
+            self.send_body(413, {'error': 'Body exceeds {} bytes'
+                                 .format(MAX_BODY)})
+            return
+        body = self.rfile.read(length)
+        metrics = self.server.metrics
+        metrics.begin()
+        start = time.perf_counter()
+        try:
+            xml, validation, timings = self.server.pool.submit(
+                convert, body, validate,
+                query.get('pretty') in ('1', 'true'), typ).result()
+        except Exception as e:
+            metrics.end(time.perf_counter() - start, 'error')
+            self.send_body(400, {'error': '{}: {}'.format(type(e).__name__,
+                                                          e)})
+            return
+        if validation is None:
+            status = 'skipped'
+        else:
+            status = 'passed' if validation['valid'] else 'failed'
+        metrics.end(time.perf_counter() - start, status, timings)
+        if fmt == 'xml':
+            self.send_body(200, xml, 'application/xml; charset=utf-8',
+                           {'X-Validation': status})
+        else:
+            self.send_body(200, {
+                'xml': xml.decode('utf-8'),
+                'valid': validation['valid'] if validation else None,
+                'errors': validation['errors'] if validation else [],
+                'timings': timings})
+
+
+class TCPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        socketserver.UnixStreamServer.server_bind(self)
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+def make_server(host=DEFAULT_HOST, port=DEFAULT_PORT, socket=None,
+                workers=None, verbose=False):
+    '''Returns the server (not yet serving), listening on <socket> if
+    given, else on <host>:<port>.
+
+    '''
+    if socket:
+        server = UnixServer(socket, Handler)
+        # BaseHTTPRequestHandler expects a (host, port) client address
+        server.get_request = lambda: (server.socket.accept()[0],
+                                      ('unix', 0))
+    else:
+        server = TCPServer((host, port), Handler)
+    workers = workers or os.cpu_count() or 1
+    server.pool = ProcessPoolExecutor(max_workers=workers,
+                                      initializer=init_worker)
+    # start (and warm) the workers now, not with the first requests
+    for f in [server.pool.submit(os.getpid) for _ in range(workers)]:
+        f.result()
+    server.metrics = Metrics()
+    server.verbose = verbose
+    return server
+
+
+def serve(server):
+    'Serves until interrupted (SIGINT, SIGTERM), then shuts down.'
+    signal.signal(signal.SIGTERM, lambda *a: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.pool.shutdown()
+
+
+def main(args):
+    'Entry point for "mkdcxml serve". <args> are the parsed docopt arguments.'
+    server = make_server(host=args['--host'] or DEFAULT_HOST,
+                         port=int(args['--port'] or DEFAULT_PORT),
+                         socket=args['--socket'],
+                         workers=int(args['--jobs']) if args['--jobs']
+                         else None,
+                         verbose=args['--verbose'])
+    where = args['--socket'] or 'http://{}:{}'.format(*server.server_address)
+    print('Serving on {}'.format(where), file=sys.stderr)
+    serve(server)
+    return 0
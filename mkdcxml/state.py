@@ -0,0 +1,87 @@
+# _*_ coding: utf-8 _*_
+
+''' State index for incremental regeneration.
+
+For each package (per CKAN server) the index records the DOI, the
+metadata_modified of the last conversion and a hash of the node-object
+that CKANExtract produced. An incremental run needs only the package
+summaries (package_search) to find the packages that changed since the
+last run; only those are fetched, extracted and converted.
+
+The index is a SQLite file.
+
+'''
+
+import time
+import sqlite3
+import hashlib
+
+from mkdcxml import codec
+
+
+def node_hash(meta):
+    'SHA-256 of the (compact json encoded) node-object <meta>.'
+    return hashlib.sha256(codec.dumps(meta)).hexdigest()
+
+
+class StateIndex:
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute('''CREATE TABLE IF NOT EXISTS state (
+                             server TEXT, name TEXT, doi TEXT,
+                             metadata_modified TEXT, node_hash TEXT,
+                             updated REAL,
+                             PRIMARY KEY (server, name))''')
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def _server(server):
+        return server.rstrip('/')
+
+    def get(self, server, name):
+        '''Returns (doi, metadata_modified, node_hash) recorded for
+        package <name>, or None.
+
+        '''
+        return self.db.execute(
+            'SELECT doi, metadata_modified, node_hash FROM state'
+            ' WHERE server = ? AND name = ?',
+            (self._server(server), name)).fetchone()
+
+    def changed(self, server, summaries):
+        '''Returns those of the package <summaries> (dicts with "name" and
+        "metadata_modified", e.g. package_search results) that are new
+        or were modified since they were recorded.
+
+        '''
+        seen = dict(self.db.execute(
+            'SELECT name, metadata_modified FROM state WHERE server = ?',
+            (self._server(server),)))
+        return [p for p in summaries
+                if seen.get(p['name']) != p['metadata_modified']]
+
+    def record(self, server, name, doi, metadata_modified, meta):
+        '''Records the conversion of package <name> to node-object <meta>.
+        Returns True if the node-object differs from the one recorded
+        before (or there was none).
+
+        '''
+        h = node_hash(meta)
+        old = self.get(server, name)
+        self.db.execute(
+            'INSERT OR REPLACE INTO state VALUES (?, ?, ?, ?, ?, ?)',
+            (self._server(server), name, doi, metadata_modified, h,
+             time.time()))
+        self.db.commit()
+        return old is None or old[2] != h
@@ -0,0 +1,185 @@
+# _*_ coding: utf-8 _*_
+
+''' Per-stage timing and profiling of conversions.
+
+A Timings object collects the wall time of each stage of one document:
+
+  MetaDataWriter:  schema, readmeta, build_tree, validate, serialize,
+                   write (or stream)
+  CKANExtract:     fetch, section:<name> for each section of the mapping
+                   (see mkdcxml.mapping)
+
+If tracemalloc is tracing, the bytes allocated by each stage (net, and
+the peak above the start of the stage) are recorded as well. Note that
+tracemalloc only sees allocations of the Python allocator, not the
+memory libxml2 allocates for trees.
+
+hook(stage, record) is called after each stage, if given.
+
+Profiler profiles each document (cProfile, or tracemalloc snapshots)
+and keeps the dumps of the outliers, i.e. those that took longer than a
+threshold. percentiles() aggregates the timings of many documents.
+
+'''
+
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+PERCENTILES = (50, 90, 99)
+
+
+class Timings:
+
+    def __init__(self, hook=None):
+        self.stages = {}
+        self.hook = hook
+
+    @contextmanager
+    def stage(self, name):
+        'Times the stage <name> (a context manager).'
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record = {'seconds': time.perf_counter() - start}
+            if tracing:
+                current, peak = tracemalloc.get_traced_memory()
+                record['alloc_bytes'] = current - before
+                record['peak_bytes'] = peak - before
+            self.add(name, record)
+
+    def add(self, name, record):
+        'Adds <record> to stage <name> (repeated stages are summed up).'
+        if name in self.stages:
+            old = self.stages[name]
+            record = {k: old.get(k, 0) + v for k, v in record.items()}
+        self.stages[name] = record
+        if self.hook is not None:
+            self.hook(name, record)
+
+    def total(self):
+        return sum(r['seconds'] for r in self.stages.values())
+
+    def as_dict(self):
+        return dict(self.stages)
+
+    def report(self, f=None, label=None):
+        'Writes a table of the stages to <f> (default: stderr).'
+        f = f or sys.stderr
+        if label:
+            print(label, file=f)
+        for name, r in self.stages.items():
+            line = '  {:<28} {:10.6f} s'.format(name, r['seconds'])
+            if 'alloc_bytes' in r:
+                line += '  {:>12} B net {:>12} B peak'.format(
+                    r['alloc_bytes'], r['peak_bytes'])
+            print(line, file=f)
+        print('  {:<28} {:10.6f} s'.format('total', self.total()), file=f)
+
+
+class NullTimings:
+    'Stands in for Timings when nothing is measured.'
+
+    def stage(self, name):
+        return nullcontext()
+
+
+NULL_TIMINGS = NullTimings()
+
+
+class Profiler:
+    '''Profiles documents with cProfile (kind "cprofile") or tracemalloc
+    (kind "tracemalloc") and dumps the profile of each document that
+    took longer than <threshold> seconds.
+
+    '''
+
+    KINDS = {'cprofile': '.prof', 'tracemalloc': '.snapshot'}
+
+    def __init__(self, threshold, kind='cprofile'):
+        if kind not in self.KINDS:
+            raise ValueError('kind must be one of {}, got {!r}'
+                             .format(tuple(self.KINDS), kind))
+        self.threshold = threshold
+        self.kind = kind
+        self.dumps = []
+        if kind == 'tracemalloc' and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def profile(self, dumpfile):
+        '''Profiles the block. If it is an outlier, the profile is dumped
+        to <dumpfile> + ".prof" (load with pstats) or ".snapshot" (load
+        with tracemalloc.Snapshot.load) and the filename is appended to
+        <dumps>.
+
+        '''
+        profiler = None
+        if self.kind == 'cprofile':
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+            if elapsed > self.threshold:
+                filename = dumpfile + self.KINDS[self.kind]
+                os.makedirs(os.path.dirname(os.path.abspath(filename)),
+                            exist_ok=True)
+                if profiler is not None:
+                    profiler.dump_stats(filename)
+                else:
+                    tracemalloc.take_snapshot().dump(filename)
+                self.dumps.append(filename)
+
+
+def percentile(values, p):
+    'The <p>th percentile of the sorted <values> (linear interpolation).'
+    if not values:
+        return None
+    k = (len(values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def percentiles(timings, ps=PERCENTILES):
+    '''Aggregates a list of per-document timings (Timings.as_dict()) into
+    {stage: {"n", "mean", "p50", ..., "max"}} of the seconds.
+
+    '''
+    seconds = {}
+    for t in timings:
+        for name, r in t.items():
+            seconds.setdefault(name, []).append(r['seconds'])
+    stats = {}
+    for name, values in seconds.items():
+        values.sort()
+        s = {'n': len(values), 'mean': sum(values) / len(values)}
+        for p in ps:
+            s['p{}'.format(p)] = percentile(values, p)
+        s['max'] = values[-1]
+        stats[name] = s
+    return stats
+
+
+def report_percentiles(stats, f=None):
+    'Writes the table of percentiles() <stats> to <f> (default: stderr).'
+    f = f or sys.stderr
+    cols = [c for c in next(iter(stats.values()), {}) if c != 'n']
+    print('  {:<28} {:>6}'.format('stage', 'n')
+          + ''.join(' {:>10}'.format(c) for c in cols), file=f)
+    for name, s in stats.items():
+        print('  {:<28} {:>6}'.format(name, s['n'])
+              + ''.join(' {:10.6f}'.format(s[c]) for c in cols), file=f)
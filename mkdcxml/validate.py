@@ -0,0 +1,125 @@
+# _*_ coding: utf-8 _*_
+
+''' Bulk validation of existing DataCite XML files ("mkdcxml validate").
+
+Each file is validated against the bundled XSD of the version it
+declares in its xsi:schemaLocation (or of a given version). The files
+are distributed over a pool of workers:
+
+  threads     (default) lxml releases the GIL while it parses a file
+              and while it validates the tree, so threads run these
+              in parallel without the cost of starting processes.
+  processes   for when the Python part (reading the error log, many
+              small files) dominates.
+
+An XMLSchema keeps the errors of the last validation in its error_log,
+so a compiled schema must not be used by two threads at once. Each
+thread therefore compiles its own schemas, once, on first use; each
+process uses the process-wide ones (see mkdcxml.get_schema).
+
+The result is a summary as for "mkdcxml batch" (see batch.summarize),
+with one record per file holding its status ("passed", "failed" or
+"error") and its validation errors.
+
+'''
+
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from lxml import etree as ET
+
+from mkdcxml.mkdcxml import (compile_schema, get_schema, prewarm, typ_of,
+                             typ_of_location, ValidationResult, XSI_NS,
+                             DEFAULT_TYP)
+from mkdcxml.batch import collect_inputs, summarize, report
+
+SUFFIXES = ('.xml', '.xml.gz')
+SCHEMA_LOCATION = '{{{}}}schemaLocation'.format(XSI_NS)
+
+# the schemas of each thread, see thread_schema()
+_local = threading.local()
+
+
+def thread_schema(typ):
+    'Returns the compiled XMLSchema for <typ> of the calling thread.'
+    schemas = getattr(_local, 'schemas', None)
+    if schemas is None:
+        schemas = _local.schemas = {}
+    schema = schemas.get(typ)
+    if schema is None:
+        schema = schemas[typ] = compile_schema(typ)
+    return schema
+
+
+def declared_typ(root, default=DEFAULT_TYP):
+    'Returns the typ declared in the xsi:schemaLocation of <root>.'
+    location = root.get(SCHEMA_LOCATION)
+    return typ_of_location(location, default) if location else default
+
+
+def validate_file(infile, typ='auto', get=thread_schema):
+    '''Validates the XML file <infile> against the schema of <typ> ("auto":
+    the declared version), obtained with get(typ). Returns a record
+    describing the outcome. Exceptions are caught, so that a single
+    broken file does not bring down the run.
+
+    '''
+    record = {'input': infile}
+    start = time.perf_counter()
+    try:
+        root = ET.parse(infile).getroot()
+        record['typ'] = declared_typ(root) if typ == 'auto' else typ
+        schema = get(record['typ'])
+        valid = schema.validate(root)
+        errors = ValidationResult.from_log(valid, schema.error_log)
+        record['status'] = 'passed' if valid else 'failed'
+        record['errors'] = errors.as_dict()['errors']
+    except Exception as e:
+        record['status'] = 'error'
+        record['error'] = '{}: {}'.format(type(e).__name__, e)
+    record['seconds'] = time.perf_counter() - start
+    return record
+
+
+def validate_in_process(job):
+    'validate_file() for process workers (process-wide schemas).'
+    infile, typ = job
+    return validate_file(infile, typ, get=get_schema)
+
+
+def run_validation(inputs, workers=None, processes=False, typ='auto',
+                   summaryfile=None):
+    '''Validates all <inputs> (files, or directories containing *.xml and
+    *.xml.gz files) with <workers> threads, or processes if <processes>
+    (default: number of CPUs). Returns the summary (a dict).
+
+    '''
+    inputs = collect_inputs(inputs, SUFFIXES)
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    if processes:
+        jobs = [(f, typ) for f in inputs]
+        chunksize = max(1, len(jobs) // (4 * workers))
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=prewarm) as pool:
+            records = list(pool.map(validate_in_process, jobs,
+                                    chunksize=chunksize))
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            records = list(pool.map(lambda f: validate_file(f, typ),
+                                    inputs))
+    return summarize(records, time.perf_counter() - start, summaryfile)
+
+
+def main(args):
+    'Entry point for "mkdcxml validate". <args> are the parsed docopt arguments.'
+    version = args['--schema'] or 'auto'
+    summary = run_validation(
+        args['<input>'],
+        workers=int(args['--jobs']) if args['--jobs'] else None,
+        processes=args['--processes'],
+        typ=version if version == 'auto' else typ_of(version),
+        summaryfile=args['--summary'])
+    return report(summary)
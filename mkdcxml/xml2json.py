@@ -0,0 +1,178 @@
+# _*_ coding: utf-8 _*_
+
+''' DataCite XML back to node-object json (the inverse of mkdcxml).
+
+The XML is read with lxml's iterparse. Each <resource> element is
+converted to a node-object as soon as it is complete and then removed
+from the tree, together with everything read before it. Memory use is
+therefore bounded by the size of one record, not by the size of the
+file, which may be a single record, a collection of records or an
+OAI-PMH response (the <resource> elements may be nested at any depth).
+Gzip-compressed files are read transparently.
+
+The node-objects are written as JSON Lines (one record per line), the
+input of "mkdcxml jsonl".
+
+Each element becomes the simplest node-object that reproduces it:
+
+  <title>A title</title>                      {"title": "A title"}
+  <titles><title>..</title></titles>          {"titles": [{"title": ..}]}
+  <subject xml:lang="en">water</subject>      {"subject": {"val": "water",
+                                                 "att": {"lang": "en"}}}
+  <br/>second line                            {"br": {"tail": "second line"}}
+  <br/>                                       {"br": []}
+
+Tags in the DataCite namespace are unqualified, others are given in
+Clark's notation, as are namespaced attributes (except xml:lang, which
+becomes "lang"). Whitespace-only text between elements (indentation) is
+dropped; comments and processing instructions are ignored.
+
+'''
+
+import sys
+import gzip
+from contextlib import contextmanager
+
+from lxml import etree as ET
+
+from mkdcxml import codec
+from mkdcxml.mkdcxml import DATACITE_NS, XML_NS
+from mkdcxml.output import open_output
+
+RESOURCE = '{{{}}}resource'.format(DATACITE_NS)
+GZIP_MAGIC = b'\x1f\x8b'
+
+# The inverse of MetaDataWriter._mk_attribute_map
+ATTRIBUTE_NAMES = {'{{{}}}lang'.format(XML_NS): 'lang'}
+
+
+def _tag(el):
+    qname = ET.QName(el)
+    return qname.localname if qname.namespace == DATACITE_NS else el.tag
+
+
+def _blank(s):
+    return s is None or not s.strip()
+
+
+def _mk_node(el):
+    '''Returns the node-object for element <el> alone, and the list to
+    which the node-objects of its children are to be appended (or None).
+
+    '''
+    children = [c for c in el if isinstance(c.tag, str)]
+    text = el.text
+    if children and _blank(text):
+        text = None
+    tail = None if _blank(el.tail) else el.tail
+    att = {ATTRIBUTE_NAMES.get(a, a): v for a, v in el.attrib.items()}
+    kids = [] if children else None
+    if not att and tail is None:
+        if not children:
+            return {_tag(el): text if text is not None else []}, None
+        if text is None:
+            return {_tag(el): kids}, kids
+    v = {}
+    if text is not None:
+        v['val'] = text
+    if att:
+        v['att'] = att
+    if children:
+        v['children'] = kids
+    if tail is not None:
+        v['tail'] = tail
+    return {_tag(el): v}, kids
+
+
+def element_to_node(root):
+    '''Returns the node-object of the element <root> and its descendants
+    (the inverse of MetaDataWriter._build_tree). The tail of <root> is
+    ignored.
+
+    '''
+    tail, root.tail = root.tail, None
+    try:
+        node, kids = _mk_node(root)
+        # Iterative depth-first traversal, as in _build_tree; the stack
+        # holds elements together with the list their node-object goes to.
+        stack = [(c, kids) for c in reversed(root) if isinstance(c.tag, str)]
+        while stack:
+            el, siblings = stack.pop()
+            child, kids = _mk_node(el)
+            siblings.append(child)
+            if kids is not None:
+                stack.extend((c, kids) for c in reversed(el)
+                             if isinstance(c.tag, str))
+        return node
+    finally:
+        root.tail = tail
+
+
+@contextmanager
+def open_source(source):
+    '''Opens <source> (a filename or a binary file object) for reading,
+    decompressing it if it is gzip-compressed.
+
+    '''
+    f = open(source, 'rb') if isinstance(source, str) else source
+    try:
+        head = f.peek(2)[:2] if hasattr(f, 'peek') else b''
+        yield gzip.GzipFile(fileobj=f, mode='rb') if head == GZIP_MAGIC else f
+    finally:
+        if f is not source:
+            f.close()
+
+
+def iter_records(source, tag=RESOURCE):
+    '''Yields the node-object of each <tag> element (default: DataCite
+    <resource>) in <source> (a filename or a binary file object).
+    Elements are released as soon as they are converted.
+
+    '''
+    # Elements outside of records (e.g. OAI-PMH headers) are released
+    # when they end; those inside are kept until their record is done.
+    depth = 0
+    for event, el in ET.iterparse(source, events=('start', 'end'),
+                                  remove_comments=True, remove_pis=True,
+                                  huge_tree=True):
+        if el.tag == tag:
+            if event == 'start':
+                depth += 1
+                continue
+            depth -= 1
+            if depth:
+                continue
+            yield element_to_node(el)
+        elif event == 'start' or depth:
+            continue
+        el.clear(keep_tail=True)
+        parent = el.getparent()
+        if parent is not None:
+            while el.getprevious() is not None:
+                del parent[0]
+
+
+def write_jsonl(source, outfile=None, compress=False):
+    '''Writes the records of <source> as JSON Lines to <outfile> (a path,
+    a binary file object, or None for stdout). Returns the number of
+    records.
+
+    '''
+    n = 0
+    with open_source(source) as src, \
+            open_output(outfile, compress=compress) as f:
+        for node in iter_records(src):
+            f.write(codec.dumps(node))
+            f.write(b'\n')
+            n += 1
+    return n
+
+
+def main(args):
+    'Entry point for "mkdcxml tojson". <args> are the parsed docopt arguments.'
+    source = args['<xmlfile>']
+    if source in (None, '-'):
+        source = sys.stdin.buffer
+    n = write_jsonl(source, args['--outfile'], compress=args['--gzip'])
+    print('{} records'.format(n), file=sys.stderr)
+    return 0
@@ -5,8 +5,15 @@ setup(
     name = 'mkdcxml',
     version = '0.1',
     packages = find_packages(),
+    python_requires = '>=3.9',
+    package_data = {'mkdcxml': ['schema/datacite/*.xsd',
+                                'schema/datacite/include/*.xsd',
+                                'schema/xslt/*.xsl']},
     install_requires = ['lxml>=4.1.1',
-                        'docopt>=0.6.2'],
+                        'docopt>=0.6.2',
+                        'ckanapi'],
+    extras_require = {'fast': ['orjson'],
+                      'async': ['aiohttp']},
     author = 'Harald von Waldow',
     author_email = 'harald.vonwaldow@eawag.ch',
     description = ("Returns the XML representation of the DataCite metadata"
@@ -16,6 +23,11 @@ setup(
     keywords = 'DataCite metadata XML',
     entry_points = {
         'console_scripts':
-        ['mkdcxml=mkdcxml.mkdcxml:main']
+        ['mkdcxml=mkdcxml.mkdcxml:main',
+         'ckan2xml=mkdcxml.pipeline:main',
+         'ckanharvest=mkdcxml.harvest:main',
+         'ckanextract=mkdcxml.ckanextract:main',
+         'ckanextract_project=mkdcxml.ckanextract_project:main',
+         'mkdcbench=mkdcxml.bench:main']
     }
 )
@@ -0,0 +1,150 @@
+# _*_ coding: utf-8 _*_
+
+''' A stand-in CKAN instance for the tests.
+
+ckan_server serves package_search and package_show (GET or POST, as
+ckanapi and aiohttp send them) from a dict of packages on a local port,
+in a thread of the test process. Its url is CKAN.url; packages named in
+CKAN.flaky fail with "500 Internal Server Error" on their first
+package_show. package_search knows the queries name:"<name>" and *:*
+and the "fl" parameter.
+
+'''
+
+import re
+import copy
+import json
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+NAME_QUERY = re.compile(r'^name:"(.*)"$')
+
+PACKAGE = {
+    'name': 'package',
+    'title': 'Test package',
+    'author': ['Doe, Jane <jane@example.org>', 'Müller, Hans'],
+    'metadata_created': '2020-03-01T10:00:00.000000',
+    'metadata_modified': '2020-04-01T10:00:00.123456',
+    'generic-terms': ['water'],
+    'taxa': ['none'],
+    'substances': [],
+    'systems': None,
+    'tags': [{'display_name': 'fish'}],
+    'timerange': ['2019-01-01 TO 2019-12-31', '*'],
+    'resources': [
+        {'url': 'https://doi.org/10.1/x',
+         'description': ('relatedIdentifier\r\nrelatedIdentifierType: DOI\r\n'
+                         'relationTypes: Cites, IsSupplementTo'),
+         'resource_type': 'Text'},
+        {'url': 'https://e.org/d.csv', 'description': 'some data',
+         'resource_type': 'Dataset'}],
+    'notes': 'Line one\r\nLine two\r\nLine three',
+    'geographic_name': ['Zurich'],
+    'spatial': ('{"type": "MultiPoint",'
+                ' "coordinates": [[8.5, 47.3], [8.6, 47.4]]}'),
+    'organization': {'name': 'eawag'},
+}
+
+
+def package(name, **fields):
+    'Returns a package_show result for package <name>, with <fields>.'
+    p = copy.deepcopy(PACKAGE)
+    p.update(name=name, doi='10.5555/' + name, **fields)
+    return p
+
+
+class CKAN:
+
+    def __init__(self, packages=()):
+        self.packages = {p['name']: p for p in packages}
+        self.flaky = set()
+        self.shown = []
+        self.searched = []
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self.handler())
+        self.url = 'http://127.0.0.1:{}'.format(self.server.server_port)
+
+    def add(self, *packages):
+        for p in packages:
+            self.packages[p['name']] = p
+
+    def handler(self):
+        ckan = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def log_message(self, *args):
+                pass
+
+            def send(self, code, body):
+                b = json.dumps(body).encode('utf-8')
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(b)))
+                self.end_headers()
+                self.wfile.write(b)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                self.action(url.path, {k: v[0] for k, v in
+                                       parse_qs(url.query).items()})
+
+            def do_POST(self):
+                n = int(self.headers.get('Content-Length') or 0)
+                self.action(urlparse(self.path).path,
+                            json.loads(self.rfile.read(n) or b'{}'))
+
+            def action(self, path, data):
+                return ckan.action(self, path.rsplit('/', 1)[-1], data)
+
+        return Handler
+
+    def action(self, handler, action, data):
+        if action == 'package_search':
+            self.searched.append(data.get('q'))
+            names = sorted(self.packages)
+            match = NAME_QUERY.match(data.get('q') or '')
+            if match:
+                names = [n for n in names if n == match.group(1)]
+            start, rows = int(data.get('start', 0)), int(data.get('rows', 10))
+            results = [self.packages[n] for n in names[start:start + rows]]
+            if data.get('fl'):
+                fields = data['fl'].split(',')
+                results = [{f: p.get(f) for f in fields} for p in results]
+            return handler.send(200, {'success': True, 'result': {
+                'count': len(names), 'results': results}})
+        if action == 'package_show':
+            name = data.get('id')
+            self.shown.append(name)
+            if name in self.flaky:
+                self.flaky.discard(name)
+                return handler.send(500, {'success': False, 'error': {
+                    '__type': 'Internal Server Error'}})
+            if name not in self.packages:
+                return handler.send(404, {'success': False, 'error': {
+                    '__type': 'Not Found Error', 'message': 'Not found'}})
+            return handler.send(200, {'success': True,
+                                      'result': self.packages[name]})
+        handler.send(400, {'success': False,
+                           'error': {'__type': 'Validation Error'}})
+
+
+def serve():
+    ckan = CKAN()
+    thread = threading.Thread(target=ckan.server.serve_forever, daemon=True)
+    thread.start()
+    yield ckan
+    ckan.server.shutdown()
+    ckan.server.server_close()
+
+
+@pytest.fixture
+def ckan_server():
+    yield from serve()
+
+
+@pytest.fixture
+def other_ckan_server():
+    yield from serve()
@@ -0,0 +1,43 @@
+# _*_ coding: utf-8 _*_
+
+''' The asyncio client against two stand-in CKAN instances. '''
+
+import pytest
+from ckanapi import NotFound
+
+from conftest import package
+from test_harvest import run
+
+pytest.importorskip('aiohttp')
+
+from mkdcxml.aioclient import fetch_packages
+
+
+def test_fetch_packages(ckan_server, other_ckan_server):
+    ckan_server.add(package('a'), package('b'))
+    ckan_server.flaky.add('b')
+    other_ckan_server.add(package('c'))
+    fetched = fetch_packages(
+        {ckan_server.url: ('key', ['a', 'b', 'missing']),
+         other_ckan_server.url: ('key', ['c'])},
+        concurrency=2, backoff=0.01)
+    first = dict(fetched[ckan_server.url])
+    assert first['a']['name'] == 'a'
+    assert first['b']['name'] == 'b'
+    assert isinstance(first['missing'], NotFound)
+    assert sorted(ckan_server.shown) == ['a', 'b', 'b', 'missing']
+    assert dict(fetched[other_ckan_server.url])['c']['name'] == 'c'
+
+
+def test_ckan2xml_async(ckan_server, tmp_path):
+    ckan_server.add(package('a'), package('b'))
+    ckan_server.flaky.add('b')
+    res = run('mkdcxml.pipeline', '-s', ckan_server.url, '-d', str(tmp_path),
+              '--async', '10.5555/a', 'a', '10.5555/b', 'b',
+              '10.5555/missing', 'missing')
+    assert res.returncode == 1
+    assert 'missing: fetch failed: NotFound' in res.stdout
+    assert (tmp_path / '10.5555_a.xml').exists()
+    assert (tmp_path / '10.5555_b.xml').exists()
+    assert sorted(ckan_server.shown) == ['a', 'b', 'b', 'missing']
+    assert ckan_server.searched == []
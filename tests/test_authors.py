@@ -0,0 +1,106 @@
+# _*_ coding: utf-8 _*_
+
+''' The author store (and the parser of CKAN author strings). '''
+
+import io
+import json
+
+import pytest
+
+from mkdcxml.authors import AuthorStore, parse_author, report_unresolved
+
+JANE = '0000-0001-0000-0001'
+JOHN = '0000-0002-0000-0002'
+
+
+@pytest.fixture
+def store():
+    with AuthorStore() as s:
+        s.add('Doe', 'Jane', email='Jane.Doe@Example.org', orcid=JANE,
+              affiliation='Eawag')
+        s.add('Müller', 'Hans-Peter', orcid=JOHN)
+        yield s
+
+
+def orcid(store, last, first, email=None):
+    author = store.lookup(last, first, email)
+    return author['orcid'] if author else None
+
+
+def test_folding(store):
+    assert orcid(store, 'Doe', 'Jane') == JANE
+    assert orcid(store, 'DOE', ' jane ') == JANE
+    assert orcid(store, 'Muller', 'Hans Peter') == JOHN
+    assert orcid(store, 'müller', 'hans-peter') == JOHN
+
+
+def test_email(store):
+    assert orcid(store, 'Doe-Smith', 'Jane', 'jane.doe@example.org') == JANE
+    assert orcid(store, 'Doe-Smith', 'Jane', 'other@example.org') is None
+
+
+def test_other_given_name_does_not_match(store):
+    # "Doe, John" got the ORCID of "Doe, Jane" (same initials)
+    assert orcid(store, 'Doe', 'John') is None
+
+
+def test_initials(store):
+    assert orcid(store, 'Doe', 'J.') == JANE
+    assert orcid(store, 'Müller', 'H. P.') == JOHN
+    assert orcid(store, 'Müller', 'H.') is None
+    store.add('Doe', 'John', orcid=JOHN)
+    # ambiguous
+    assert orcid(store, 'Doe', 'J.') is None
+    assert orcid(store, 'Doe', 'John') == JOHN
+
+
+def test_add_updates(store):
+    store.add('doe', 'JANE', affiliation='ETH')
+    assert store.lookup('Doe', 'Jane') == {
+        'name': 'Doe, Jane', 'orcid': JANE, 'affiliation': 'ETH'}
+
+
+def test_import_maps():
+    with AuthorStore() as s:
+        s.import_maps(orcids={'Doe, Jane': JANE, 'Roe, Richard': JOHN},
+                      affils={'Doe, Jane': 'Eawag', 'Poe, Edgar': 'UVA'})
+        assert s.lookup('Doe', 'Jane') == {
+            'name': 'Doe, Jane', 'orcid': JANE, 'affiliation': 'Eawag'}
+        assert s.lookup('Roe', 'Richard')['affiliation'] is None
+        assert s.lookup('Poe', 'Edgar')['orcid'] is None
+
+
+def test_unresolved_report(store, tmp_path):
+    assert store.resolve('Doe', 'Jane', context='pkg-1')['orcid'] == JANE
+    assert store.resolve('Doe', 'John', 'john@example.org', 'pkg-1') is None
+    assert store.resolve('Roe', 'R.', context='pkg-2') is None
+    expected = [
+        {'name': 'Doe, John', 'email': 'john@example.org',
+         'context': 'pkg-1'},
+        {'name': 'Roe, R.', 'email': None, 'context': 'pkg-2'}]
+    f = io.StringIO()
+    store.report(f)
+    assert json.loads(f.getvalue()) == expected
+    report = tmp_path / 'unresolved.json'
+    report_unresolved(store, str(report))
+    assert json.loads(report.read_text()) == expected
+
+
+@pytest.mark.parametrize('s, expected', [
+    ('Doe, Jane <jane@example.org>', ('Doe', 'Jane', 'jane@example.org')),
+    ('Doe, Jane', ('Doe', 'Jane', None)),
+    ('  Doe ,  Jane  ', ('Doe', 'Jane', None)),
+    # more than one comma: split on the first, the rest is given name
+    ('Doe, Jane, Jr.', ('Doe', 'Jane Jr.', None)),
+    ('Doe,Jane,, ', ('Doe', 'Jane', None)),
+    ('Doe, Jane (jane@example.org)', ('Doe', 'Jane', 'jane@example.org')),
+    ('Doe, Jane jane@example.org', ('Doe', 'Jane', 'jane@example.org')),
+    ('jane@example.org Doe, Jane', ('Doe', 'Jane', 'jane@example.org')),
+    ('Jane Doe', ('Doe', 'Jane', None)),
+    ('Jane Q. Doe <j@example.org>', ('Doe', 'Jane Q.', 'j@example.org')),
+    ('Müller, Hans', ('Müller', 'Hans', None)),
+    ('Doe', ('Doe', '', None)),
+    ('', ('', '', None)),
+])
+def test_parse_author(s, expected):
+    assert parse_author(s) == expected
@@ -0,0 +1,31 @@
+# _*_ coding: utf-8 _*_
+
+''' The report of batch (and jsonl, validate) runs. '''
+
+from mkdcxml.batch import report, summarize
+
+
+def error(n):
+    return {'line': n, 'column': 0, 'path': '/resource', 'level': 'ERROR',
+            'type': 'SCHEMAV_ELEMENT_CONTENT',
+            'message': 'message {}'.format(n)}
+
+
+def test_report_gives_reasons(capsys):
+    records = [
+        {'input': 'good.json', 'status': 'passed', 'errors': [],
+         'seconds': 0.1},
+        {'input': 'in.jsonl:4', 'status': 'error', 'seconds': 0.1,
+         'error': 'JSONDecodeError: Expecting value'},
+        {'input': 'bad.json', 'status': 'failed', 'seconds': 0.1,
+         'errors': [error(n) for n in range(1, 8)]},
+    ]
+    assert report(summarize(records, 0.3)) == 1
+    err = capsys.readouterr().err.splitlines()
+    assert err[:3] == ['ERROR: in.jsonl:4',
+                       '  JSONDecodeError: Expecting value',
+                       'FAILED: bad.json']
+    assert err[3] == '  /resource:1: message 1'
+    assert err[7] == '  /resource:5: message 5'
+    assert err[8] == '  ... 2 more'
+    assert 'good.json' not in '\n'.join(err)
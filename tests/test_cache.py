@@ -0,0 +1,59 @@
+# _*_ coding: utf-8 _*_
+
+''' MetaCache, and the cached fetch of the extractors. '''
+
+from mkdcxml import cache
+from mkdcxml.cache import MetaCache
+from mkdcxml.ckanextract import CKANExtract
+from conftest import package
+
+DAY = 24 * 3600
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1e9
+
+    def __call__(self):
+        return self.now
+
+
+def test_confirmed_entries_survive_ttl(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, 'time', clock)
+    mc = MetaCache(str(tmp_path / 'c.sqlite'), ttl=DAY)
+    old = package('old')
+    mc.put('http://ckan', 'old', old)
+    for night in range(3):
+        clock.now += DAY - 60
+        assert mc.get('http://ckan', 'old',
+                      old['metadata_modified']) == old
+        mc.put('http://ckan', 'other{}'.format(night), package('other'))
+    assert mc.get('http://ckan', 'old', old['metadata_modified']) == old
+    # not confirmed for longer than ttl: dropped
+    clock.now += DAY + 60
+    mc.put('http://ckan', 'new', package('new'))
+    assert mc.get('http://ckan', 'old', old['metadata_modified']) is None
+
+
+def test_extractor_sees_changes(ckan_server, tmp_path, monkeypatch):
+    monkeypatch.setenv('CKAN_APIKEY_PROD1', 'key')
+    ckan_server.add(package('pkg'))
+    mc = MetaCache(str(tmp_path / 'c.sqlite'))
+
+    def extract():
+        return CKANExtract('pkg', '10.5555/pkg', None, ckan_server.url,
+                           None, None, None, cache=mc, answers={})
+
+    assert extract().ckanmeta['title'] == 'Test package'
+    extract()
+    assert ckan_server.shown == ['pkg']
+    ckan_server.add(package('pkg', title='Edited',
+                            metadata_modified='2021-01-01T00:00:00.000000'))
+    assert extract().ckanmeta['title'] == 'Edited'
+    assert ckan_server.shown == ['pkg', 'pkg']
+    assert ckan_server.searched == ['name:"pkg"'] * 3
+    mc.offline = True
+    assert extract().ckanmeta['title'] == 'Edited'
+    assert len(ckan_server.searched) == 3
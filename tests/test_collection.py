@@ -0,0 +1,69 @@
+# _*_ coding: utf-8 _*_
+
+''' Many records in one document (CollectionWriter), read back with
+xml2json.
+
+'''
+
+import pytest
+from lxml import etree as ET
+
+from mkdcxml.collection import CollectionWriter, OAI_NS
+from mkdcxml.ckanextract import CKANExtract
+from mkdcxml.mkdcxml import MetaDataWriter
+from mkdcxml.xml2json import iter_records, open_source
+from mkdcxml.jsonl import identifier_of
+from conftest import package
+
+NAMES = ['a', 'b', 'c']
+
+
+def record(name, **fields):
+    ex = CKANExtract(name, '10.5555/' + name, None, 'http://ckan', None,
+                     None, None, ckanmeta=package(name, **fields),
+                     answers={})
+    return ex.extract()
+
+
+def read(path):
+    with open_source(path) as f:
+        return [identifier_of(r) for r in iter_records(f)]
+
+
+@pytest.mark.parametrize('envelope', ['collection', 'oai'])
+@pytest.mark.parametrize('compress', [False, True])
+def test_collection(tmp_path, envelope, compress):
+    target = str(tmp_path / 'out.xml')
+    with CollectionWriter(target, envelope=envelope,
+                          compress=compress) as cw:
+        for name in NAMES:
+            assert cw.add(MetaDataWriter(record(name)))
+        # invalid: no creators
+        assert not cw.add(MetaDataWriter(record('invalid', author=[])))
+    assert (cw.count, cw.rejected) == (3, 1)
+    assert read(target) == ['10.5555/' + n for n in NAMES]
+    with open_source(target) as f:
+        root = ET.parse(f).getroot()
+    if envelope == 'oai':
+        assert root.tag == '{{{}}}OAI-PMH'.format(OAI_NS)
+        assert root.xpath('//oai:header/oai:identifier/text()',
+                          namespaces={'oai': OAI_NS}) == [
+            'doi:10.5555/' + n for n in NAMES]
+    else:
+        assert root.tag == 'collection'
+
+
+def test_stream_mode(tmp_path):
+    target = str(tmp_path / 'out.xml')
+    with CollectionWriter(target) as cw:
+        for name in NAMES:
+            assert cw.add(MetaDataWriter(record(name), build=False),
+                          identifier='10.5555/' + name)
+    assert (cw.count, cw.rejected) == (3, 0)
+    assert read(target) == ['10.5555/' + n for n in NAMES]
+
+
+def test_add_when_closed():
+    cw = CollectionWriter(None)
+    with pytest.raises(ValueError):
+        cw.add(MetaDataWriter(record('a')))
@@ -0,0 +1,65 @@
+# _*_ coding: utf-8 _*_
+
+''' ckanharvest and ckan2xml, unattended, against the stand-in CKAN. '''
+
+import os
+import sys
+import json
+import subprocess
+
+from conftest import package
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run(module, *args):
+    'Runs <module> with <args> without a terminal on stdin.'
+    env = dict(os.environ, PYTHONPATH=ROOT, CKAN_APIKEY_PROD1='key',
+               CKAN_APIKEY_EXT='key')
+    return subprocess.run([sys.executable, '-m', module] + list(args),
+                          stdin=subprocess.DEVNULL, capture_output=True,
+                          text=True, env=env, timeout=60)
+
+
+def test_harvest_unattended(ckan_server, tmp_path):
+    ckan_server.add(package('good'),
+                    package('nospatial', spatial=None),
+                    package('broken', author=None))
+    ckan_server.flaky.add('good')
+    report = tmp_path / 'unresolved.json'
+    res = run('mkdcxml.harvest', '-s', ckan_server.url, '-j', '2',
+              '-d', str(tmp_path), '--authors', str(tmp_path / 'a.sqlite'),
+              '--unresolved', str(report))
+    assert 'EOFError' not in res.stderr
+    assert res.returncode == 1
+    assert 'broken: error: TypeError' in res.stdout
+    assert 'good: Valid' in res.stdout
+    assert (tmp_path / '10.5555_good.xml').exists()
+    assert (tmp_path / '10.5555_nospatial.xml').exists()
+    assert not (tmp_path / '10.5555_broken.xml').exists()
+    unresolved = json.loads(report.read_text())
+    assert len(unresolved) == 4
+
+
+def test_harvest_answers(ckan_server, tmp_path):
+    ckan_server.add(package('good'))
+    res = run('mkdcxml.harvest', '-s', ckan_server.url, '-d', str(tmp_path),
+              '--resource-type=Measurements', '--resource-version=2.0')
+    assert res.returncode == 0, res.stdout + res.stderr
+    xml = (tmp_path / '10.5555_good.xml').read_text()
+    assert 'resourceTypeGeneral="Collection">Measurements<' in xml
+    assert '<version>2.0</version>' in xml
+    assert 'nameIdentifier' not in xml
+    assert 'affiliation' not in xml
+
+
+def test_ckan2xml_unattended(ckan_server, tmp_path):
+    ckan_server.add(package('good'))
+    res = run('mkdcxml.pipeline', '-s', ckan_server.url, '-d', str(tmp_path),
+              '--resource-type-general=Nonsense',
+              '10.5555/bad', 'good', '10.5555/missing', 'missing',
+              '10.5555/good', 'good')
+    assert 'EOFError' not in res.stderr
+    assert res.returncode == 1
+    assert 'good: error: ValueError' in res.stdout
+    assert 'missing: error: NotFound' in res.stdout
@@ -0,0 +1,50 @@
+# _*_ coding: utf-8 _*_
+
+''' Nodes and their json form. '''
+
+import pytest
+
+from mkdcxml import codec
+from mkdcxml.node import Node
+from mkdcxml.mkdcxml import MetaDataWriter
+from test_versions import metadata
+
+NODES = [
+    Node('title', val='A title'),
+    Node('titles', children=[Node('title', val='A title')]),
+    Node('subjects', children=[]),
+    Node('subject', val='water', att={'lang': 'en'}),
+    Node('br', tail='second line'),
+    Node('description', val='first', att={'descriptionType': 'Abstract'},
+         children=[Node('br', tail='second')]),
+    Node('version'),
+    Node('resource', children=[Node('version'), Node('language', val='en')]),
+]
+
+
+@pytest.mark.parametrize('node', NODES)
+def test_roundtrip(node):
+    d = node.to_json()
+    assert Node.from_json(d) == node
+    assert codec.loads(codec.dumps(node)) == d
+
+
+def test_empty_node():
+    assert Node('version').to_json() == {'version': {}}
+
+
+def test_writer_reads_json_of_nodes():
+    node = Node('resource', children=[Node('version')])
+    assert (MetaDataWriter(node.to_json(), validate='skip').tostring()
+            == MetaDataWriter(node, validate='skip').tostring())
+    # as written before empty nodes were {"tag": {}}
+    assert (MetaDataWriter({'resource': [{'version': None}]},
+                           validate='skip').tostring()
+            == MetaDataWriter(node, validate='skip').tostring())
+
+
+def test_extracted_record():
+    node = Node.from_json(metadata())
+    assert node.to_json() == metadata()
+    assert (MetaDataWriter(codec.loads(codec.dumps(node))).tostring()
+            == MetaDataWriter(node).tostring())
@@ -0,0 +1,110 @@
+# _*_ coding: utf-8 _*_
+
+''' open_output: atomic replacement of regular files, in-place writing
+of everything else.
+
+'''
+
+import os
+import gzip
+import stat
+import threading
+
+import pytest
+
+from mkdcxml.output import open_output
+
+
+def write(target, data=b'new', **kwargs):
+    with open_output(str(target), **kwargs) as f:
+        f.write(data)
+
+
+def test_new_file_respects_umask(tmp_path):
+    old = os.umask(0o077)
+    try:
+        write(tmp_path / 'a.xml')
+    finally:
+        os.umask(old)
+    assert (tmp_path / 'a.xml').read_bytes() == b'new'
+    assert stat.S_IMODE(os.stat(str(tmp_path / 'a.xml')).st_mode) == 0o600
+    assert os.listdir(str(tmp_path)) == ['a.xml']
+
+
+def test_replace_keeps_mode(tmp_path):
+    target = tmp_path / 'a.xml'
+    target.write_bytes(b'old')
+    os.chmod(str(target), 0o640)
+    inode = os.stat(str(target)).st_ino
+    write(target)
+    assert target.read_bytes() == b'new'
+    assert stat.S_IMODE(os.stat(str(target)).st_mode) == 0o640
+    # replaced, not rewritten
+    assert os.stat(str(target)).st_ino != inode
+
+
+def test_exception_keeps_old_file(tmp_path):
+    target = tmp_path / 'a.xml'
+    target.write_bytes(b'old')
+    with pytest.raises(RuntimeError):
+        with open_output(str(target)) as f:
+            f.write(b'half')
+            raise RuntimeError('crash')
+    assert target.read_bytes() == b'old'
+    assert os.listdir(str(tmp_path)) == ['a.xml']
+
+
+def test_symlink_is_written_through(tmp_path):
+    real = tmp_path / 'real.xml'
+    real.write_bytes(b'old')
+    link = tmp_path / 'link.xml'
+    os.symlink(str(real), str(link))
+    write(link)
+    assert os.path.islink(str(link))
+    assert real.read_bytes() == b'new'
+
+
+def test_hard_link_is_written_in_place(tmp_path):
+    target = tmp_path / 'a.xml'
+    target.write_bytes(b'old')
+    other = tmp_path / 'b.xml'
+    os.link(str(target), str(other))
+    write(target)
+    assert other.read_bytes() == b'new'
+    assert os.stat(str(target)).st_ino == os.stat(str(other)).st_ino
+
+
+def test_dev_null():
+    write(os.devnull)
+    assert stat.S_ISCHR(os.stat(os.devnull).st_mode)
+
+
+def test_fifo(tmp_path):
+    fifo = str(tmp_path / 'fifo')
+    os.mkfifo(fifo)
+    received = []
+
+    def read():
+        with open(fifo, 'rb') as f:
+            received.append(f.read())
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    write(fifo)
+    reader.join(10)
+    assert received == [b'new']
+    assert stat.S_ISFIFO(os.stat(fifo).st_mode)
+
+
+def test_gzip(tmp_path):
+    write(tmp_path / 'a.xml.gz', compress=True)
+    assert gzip.open(str(tmp_path / 'a.xml.gz')).read() == b'new'
+
+
+def test_not_atomic(tmp_path):
+    target = tmp_path / 'a.xml'
+    target.write_bytes(b'old')
+    inode = os.stat(str(target)).st_ino
+    write(target, atomic=False)
+    assert target.read_bytes() == b'new'
+    assert os.stat(str(target)).st_ino == inode
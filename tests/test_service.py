@@ -0,0 +1,92 @@
+# _*_ coding: utf-8 _*_
+
+''' The conversion service ("mkdcxml serve"). '''
+
+import json
+import threading
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pytest
+
+from mkdcxml import codec
+from mkdcxml.service import make_server
+from mkdcxml.mkdcxml import VERSIONS
+from test_versions import metadata, declared
+
+
+@pytest.fixture(scope='module')
+def service():
+    server = make_server(port=0, workers=1)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://{}:{}'.format(*server.server_address)
+    server.shutdown()
+    server.server_close()
+    server.pool.shutdown()
+
+
+def request(url, body=None):
+    'Returns (status, headers, body) of a GET, or a POST of <body>.'
+    try:
+        with urlopen(url, data=body, timeout=30) as resp:
+            return resp.status, resp.headers, resp.read()
+    except HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+def test_convert_json(service):
+    status, headers, body = request(service + '/convert',
+                                    codec.dumps(metadata()))
+    assert status == 200
+    result = json.loads(body)
+    assert result['valid'] is True
+    assert result['errors'] == []
+    assert declared(result['xml'].encode('utf-8')) == \
+        VERSIONS['datacite4.4']['location']
+    assert 'build_tree' in result['timings']
+
+
+def test_convert_xml(service):
+    status, headers, body = request(
+        service + '/convert?format=xml&schema=4.1&validate=eager',
+        codec.dumps(metadata()))
+    assert status == 200
+    assert headers['Content-Type'].startswith('application/xml')
+    assert headers['X-Validation'] == 'passed'
+    assert declared(body) == VERSIONS['datacite4.1']['location']
+
+
+def test_convert_invalid(service):
+    meta = metadata()
+    meta['resource'] = [n for n in meta['resource'] if 'creators' not in n]
+    status, headers, body = request(service + '/convert',
+                                    codec.dumps(meta))
+    assert status == 200
+    result = json.loads(body)
+    assert result['valid'] is False
+    assert result['errors']
+
+
+@pytest.mark.parametrize('path, body', [
+    ('/convert', b'{not json'),
+    ('/convert?schema=4.2', b'{}'),
+    ('/convert?format=html', b'{}'),
+])
+def test_bad_requests(service, path, body):
+    status, headers, body = request(service + path, body)
+    assert status == 400
+    assert 'error' in json.loads(body)
+
+
+def test_health_and_metrics(service):
+    status, headers, body = request(service + '/health')
+    assert (status, json.loads(body)) == (200, {'status': 'ok'})
+    request(service + '/convert', codec.dumps(metadata()))
+    status, headers, body = request(service + '/metrics')
+    assert status == 200
+    metrics = json.loads(body)
+    assert metrics['requests'] >= 1
+    assert metrics['in_flight'] == 0
+    assert metrics['latency']['n'] == metrics['requests']
+    assert request(service + '/nowhere')[0] == 404
@@ -0,0 +1,56 @@
+# _*_ coding: utf-8 _*_
+
+''' Incremental harvests (ckanharvest --state). '''
+
+import os
+
+from conftest import package
+from test_harvest import run
+
+# later on the same day (the date is the Submitted date of the XML)
+MODIFIED = '2020-04-01T12:00:00.000000'
+
+
+def test_incremental_harvest(ckan_server, tmp_path):
+    outdir = tmp_path / 'out'
+    ckan_server.add(package('a'), package('b'),
+                    # invalid XML: never recorded, so retried every run
+                    package('invalid', author=[]))
+
+    def harvest():
+        del ckan_server.shown[:]
+        res = run('mkdcxml.harvest', '-s', ckan_server.url,
+                  '-d', str(outdir), '--state', str(tmp_path / 's.sqlite'))
+        return res, sorted(ckan_server.shown)
+
+    def inodes():
+        return {f: os.stat(str(outdir / f)).st_ino
+                for f in os.listdir(str(outdir))}
+
+    res, shown = harvest()
+    assert res.returncode == 1
+    assert shown == ['a', 'b', 'invalid']
+    first = inodes()
+    assert sorted(first) == ['10.5555_a.xml', '10.5555_b.xml',
+                             '10.5555_invalid.xml']
+
+    res, shown = harvest()
+    assert '1 packages changed since last run' in res.stdout
+    assert shown == ['invalid']
+    assert inodes()['10.5555_a.xml'] == first['10.5555_a.xml']
+    assert inodes()['10.5555_b.xml'] == first['10.5555_b.xml']
+
+    # b edited; a modified in a field the mapping doesn't use
+    ckan_server.add(package('a', metadata_modified=MODIFIED, views=3),
+                    package('b', metadata_modified=MODIFIED,
+                            title='Edited'))
+    res, shown = harvest()
+    assert shown == ['a', 'b', 'invalid']
+    assert 'a: unchanged' in res.stdout
+    third = inodes()
+    assert third['10.5555_a.xml'] == first['10.5555_a.xml']
+    assert third['10.5555_b.xml'] != first['10.5555_b.xml']
+    assert 'Edited' in (outdir / '10.5555_b.xml').read_text()
+
+    res, shown = harvest()
+    assert shown == ['invalid']
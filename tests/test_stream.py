@@ -0,0 +1,37 @@
+# _*_ coding: utf-8 _*_
+
+''' Streaming (MetaDataWriter.streamxml) against building the tree. '''
+
+import io
+
+import pytest
+
+from mkdcxml.mkdcxml import MetaDataWriter
+from mkdcxml.bench import synthetic_record
+from test_versions import metadata
+
+
+def streamed(meta):
+    f = io.BytesIO()
+    MetaDataWriter(meta, build=False)._stream(f)
+    return f.getvalue()
+
+
+def built(meta):
+    f = io.BytesIO()
+    MetaDataWriter(meta, validate='skip').writexml(f, pretty_print=False)
+    return f.getvalue()
+
+
+@pytest.mark.parametrize('meta', [metadata(), synthetic_record(50)])
+def test_stream_equals_tree(meta):
+    assert streamed(meta) == built(meta)
+
+
+def test_stream_deep_nesting():
+    # deeper than the recursion limit
+    node = {'p': {'val': 'x', 'tail': 't'}}
+    for _ in range(5000):
+        node = {'p': {'children': [node], 'tail': 't'}}
+    xml = streamed({'resource': [node]})
+    assert xml.endswith(b'x</p>t' + b'</p>t' * 5000 + b'</resource>')
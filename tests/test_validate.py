@@ -0,0 +1,45 @@
+# _*_ coding: utf-8 _*_
+
+''' Bulk validation ("mkdcxml validate"). '''
+
+import gzip
+
+import pytest
+
+from mkdcxml.mkdcxml import MetaDataWriter
+from mkdcxml.validate import run_validation
+from test_versions import metadata
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    'A directory with a valid (gzipped), an invalid and a broken file.'
+    good = MetaDataWriter(metadata()).to_version('datacite4.1').tostring()
+    with gzip.open(str(tmp_path / 'good.xml.gz'), 'wb') as f:
+        f.write(good)
+    # no <creators>
+    (tmp_path / 'invalid.xml').write_bytes(
+        good.replace(b'<creators>', b'<!--').replace(b'</creators>', b'-->'))
+    (tmp_path / 'broken.xml').write_bytes(good[:200])
+    (tmp_path / 'ignored.json').write_text('{}')
+    return tmp_path
+
+
+@pytest.mark.parametrize('processes', [False, True])
+def test_run_validation(inputs, processes):
+    summary = run_validation([str(inputs)], workers=2, processes=processes)
+    assert (summary['total'], summary['passed'], summary['failed'],
+            summary['errors']) == (3, 1, 1, 1)
+    files = {r['input'].rsplit('/', 1)[-1]: r for r in summary['files']}
+    assert files['good.xml.gz']['typ'] == 'datacite4.1'
+    assert files['good.xml.gz']['errors'] == []
+    assert files['invalid.xml']['status'] == 'failed'
+    assert 'creators' in files['invalid.xml']['errors'][0]['message']
+    assert files['broken.xml']['status'] == 'error'
+    assert files['broken.xml']['error'].startswith('XMLSyntaxError')
+
+
+def test_given_version(inputs):
+    summary = run_validation([str(inputs / 'good.xml.gz')],
+                             typ='datacite4.4')
+    assert summary['files'][0]['typ'] == 'datacite4.4'
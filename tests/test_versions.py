@@ -0,0 +1,76 @@
+# _*_ coding: utf-8 _*_
+
+''' Schema versions through mkdcxml, tojson, jsonl, ckan2xml's convert
+and the service.
+
+'''
+
+import pytest
+from lxml import etree as ET
+
+from mkdcxml import codec, jsonl, service, xml2json
+from mkdcxml.mkdcxml import (MetaDataWriter, stream_writer, VERSIONS,
+                             XSI_NS)
+from mkdcxml.ckanextract import CKANExtract
+from mkdcxml.pipeline import convert
+from conftest import package
+from test_harvest import run
+
+LOCATION = '{{{}}}schemaLocation'.format(XSI_NS)
+
+
+def metadata():
+    'A node-object as the extractor makes it (declaring no version).'
+    ex = CKANExtract('pkg', '10.5555/pkg', None, 'http://ckan', None, None,
+                     None, ckanmeta=package('pkg'), answers={})
+    return ex.extract().to_json()
+
+
+def declared(xml):
+    return ET.fromstring(xml).get(LOCATION).split()[1]
+
+
+def test_roundtrip_keeps_version(tmp_path):
+    xml41 = tmp_path / 'v41.xml'
+    MetaDataWriter(metadata()).to_version('datacite4.1').writexml(str(xml41))
+    lines = tmp_path / 'v41.jsonl'
+    assert xml2json.write_jsonl(str(xml41), str(lines)) == 1
+    with open(str(lines), 'rb') as f:
+        [record] = jsonl.convert_stream(f, str(tmp_path / 'out'))
+    assert record['status'] == 'passed', record
+    with open(record['output'], 'rb') as f:
+        assert declared(f.read()) == VERSIONS['datacite4.1']['location']
+
+
+def test_stream_rejects_other_version():
+    meta = metadata()
+    assert stream_writer(meta, '4.4').typ == 'datacite4.4'
+    with pytest.raises(ValueError):
+        stream_writer(meta, '4.1')
+
+
+def test_convert_versions():
+    meta = metadata()
+    xml, validation = convert(meta, typ='datacite4.1')
+    assert validation.valid
+    assert declared(xml) == VERSIONS['datacite4.1']['location']
+    xml, validation, timings = service.convert(codec.dumps(meta),
+                                               typ='datacite4.1')
+    assert validation['valid']
+    assert declared(xml) == VERSIONS['datacite4.1']['location']
+    xml, validation, timings = service.convert(codec.dumps(meta))
+    assert declared(xml) == VERSIONS['datacite4.4']['location']
+
+
+@pytest.mark.parametrize('args', [
+    ['mkdcxml.mkdcxml', '--schema=4.2', 'in.json'],
+    ['mkdcxml.mkdcxml', 'batch', '--schema=4.1,4.2', 'in.json'],
+    ['mkdcxml.mkdcxml', 'jsonl', '--schema=4.2', 'in.jsonl'],
+    ['mkdcxml.mkdcxml', 'validate', '--schema=4.2', 'in.xml'],
+    ['mkdcxml.pipeline', '--schema=4.2', '10.5555/pkg', 'pkg'],
+])
+def test_unknown_schema(args):
+    res = run(*args)
+    assert res.returncode == 1
+    assert res.stderr == ('Unknown DataCite schema version "4.2"'
+                          ' (known: datacite4.1, datacite4.4)\n')